@@ -2,13 +2,261 @@ import json
 import zlib
 import time
 import csv
+import re
+import os
+import struct
+import sys
+import threading
+import functools
+from collections import Counter, deque
+from functools import partial
+from types import MappingProxyType
 
-def load_valid_codes(file_path="valid_codes.json"):
+# NumPy is optional and only the vectorized paths need it; it is imported on first use to keep `import MRTD` cheap
+_numpy = None
+_numpy_lock = threading.Lock()
+
+def _get_numpy():
+    """Import NumPy on first use and return it, or None if it is not installed (safe to call from any thread)."""
+    global _numpy
+    if _numpy is None:
+        with _numpy_lock:
+            if _numpy is None:
+                try:
+                    import numpy
+                except ImportError:
+                    numpy = False
+                _numpy = numpy
+    return _numpy or None
+
+# Fixed MRZ layout: 44 characters of line 1, ';' separator, 43 characters of line 2
+LINE1_WIDTH = 44
+LINE2_WIDTH = 43
+RECORD_WIDTH = LINE1_WIDTH + 1 + LINE2_WIDTH
+# Fixed-width record files store one ASCII record per line, newline included
+FIXED_RECORD_SIZE = RECORD_WIDTH + 1
+
+# (start, end, check digit position) of each check-digit protected field in line 2
+LINE2_CHECKED_FIELDS = ((0, 9, 9), (13, 19, 19), (21, 27, 27), (28, 37, 42))
+
+# Code tables live next to this module so loading them does not depend on the working directory
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VALID_CODES_PATH = os.path.join(MODULE_DIR, 'valid_codes.json')
+# Optional prebuilt tables written by build_code_tables; MRTD_CODE_TABLES overrides the location
+DEFAULT_CODE_TABLES_PATH = os.path.join(MODULE_DIR, 'valid_codes.pickle')
+
+def load_valid_codes(file_path=DEFAULT_VALID_CODES_PATH):
     """Load valid codes from a JSON file."""
     with open(file_path, 'r') as file:
         return json.load(file)
 
-VALID_CODES = load_valid_codes()
+# Country codes are three characters from A-Z, shorter codes are padded with '<' (e.g. 'D<<')
+CODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ<'
+CODE_SPACE = len(CODE_ALPHABET) ** 3
+# Byte value -> position in CODE_ALPHABET, len(CODE_ALPHABET) for any other byte
+CODE_CHAR_VALUES = bytes(CODE_ALPHABET.find(chr(byte)) if chr(byte) in CODE_ALPHABET else len(CODE_ALPHABET)
+                         for byte in range(256))
+
+class CountryCodeIndex:
+    """Bitset over the 27^3 space of three-character country codes.
+
+    The bitset is the serialized form; string lookups go through a frozenset derived
+    from it once, and NumPy columns of codes are checked with a single table lookup.
+    """
+
+    def __init__(self, bits):
+        if len(bits) != (CODE_SPACE + 7) // 8:
+            raise ValueError("Country code bitset has the wrong size")
+        self.bits = bytes(bits)
+        self.codes = frozenset(self.iter_codes())
+        self._lookup = None
+        self._char_values = None
+
+    @staticmethod
+    def key(code) -> int:
+        """Map a code (str or bytes, padded with '<' to three characters) to its bit position, or -1."""
+        if isinstance(code, str):
+            code = code.encode('latin-1', 'replace')
+        code = code.ljust(3, b'<')
+        if len(code) != 3:
+            return -1
+        radix = len(CODE_ALPHABET)
+        values = [CODE_CHAR_VALUES[byte] for byte in code]
+        if radix in values:
+            return -1
+        return (values[0] * radix + values[1]) * radix + values[2]
+
+    @classmethod
+    def from_codes(cls, codes):
+        """Build the index from an iterable of codes (e.g. the keys of VALID_CODES)."""
+        bits = bytearray((CODE_SPACE + 7) // 8)
+        for code in codes:
+            key = cls.key(code)
+            if key >= 0:
+                bits[key >> 3] |= 1 << (key & 7)
+        return cls(bits)
+
+    def iter_codes(self):
+        """Yield every three-character code present in the index."""
+        radix = len(CODE_ALPHABET)
+        for key in range(CODE_SPACE):
+            if self.bits[key >> 3] & (1 << (key & 7)):
+                yield CODE_ALPHABET[key // (radix * radix)] + CODE_ALPHABET[key // radix % radix] + CODE_ALPHABET[key % radix]
+
+    def __contains__(self, code) -> bool:
+        if isinstance(code, str) and len(code) == 3:
+            return code in self.codes
+        key = self.key(code)
+        return key >= 0 and bool(self.bits[key >> 3] & (1 << (key & 7)))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def mask(self, column):
+        """Boolean mask of the rows of an (n, 3) uint8 column whose code is in the index (requires NumPy)."""
+        np = _get_numpy()
+        if self._lookup is None:
+            present = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8), bitorder='little')[:CODE_SPACE]
+            # _lookup is published last, so concurrent callers never see it without _char_values
+            self._char_values = np.frombuffer(CODE_CHAR_VALUES, dtype=np.uint8).astype(np.int32)
+            # One extra slot, always False, for codes containing characters outside the alphabet
+            self._lookup = np.append(present.astype(bool), False)
+        radix = len(CODE_ALPHABET)
+        values = self._char_values[column]
+        keys = (values[:, 0] * radix + values[:, 1]) * radix + values[:, 2]
+        keys[(values == radix).any(axis=1)] = CODE_SPACE
+        return self._lookup[keys]
+
+    def to_bytes(self) -> bytes:
+        return self.bits
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(data)
+
+    def save(self, file_path: str):
+        """Serialize the bitset to a file."""
+        with open(file_path, 'wb') as file:
+            file.write(self.bits)
+
+    @classmethod
+    def load(cls, file_path: str):
+        """Load a bitset written by save()."""
+        with open(file_path, 'rb') as file:
+            return cls(file.read())
+
+_code_tables = None
+_code_tables_lock = threading.Lock()
+
+def build_code_tables(output_path: str = DEFAULT_CODE_TABLES_PATH, codes_path: str = DEFAULT_VALID_CODES_PATH):
+    """Prebuild the code tables (valid codes and country code index) into a pickle for fast worker startup."""
+    import pickle
+    valid_codes = load_valid_codes(codes_path)
+    tables = {"valid_codes": valid_codes, "country_code_index": CountryCodeIndex.from_codes(valid_codes)}
+    with open(output_path, 'wb') as file:
+        pickle.dump(tables, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return tables
+
+def _load_code_tables():
+    """Load the code tables from the prebuilt pickle when it is up to date, otherwise from valid_codes.json."""
+    import pickle
+    tables_path = os.environ.get('MRTD_CODE_TABLES', DEFAULT_CODE_TABLES_PATH)
+    if os.path.exists(tables_path) and (not os.path.exists(DEFAULT_VALID_CODES_PATH) or
+                                        os.path.getmtime(tables_path) >= os.path.getmtime(DEFAULT_VALID_CODES_PATH)):
+        with open(tables_path, 'rb') as file:
+            return pickle.load(file)
+    valid_codes = load_valid_codes()
+    return {"valid_codes": valid_codes, "country_code_index": CountryCodeIndex.from_codes(valid_codes)}
+
+def get_code_tables():
+    """Return the code tables, loading them once per process on first use."""
+    global _code_tables
+    if _code_tables is None:
+        with _code_tables_lock:
+            if _code_tables is None:
+                _code_tables = _load_code_tables()
+    return _code_tables
+
+def reset_code_tables():
+    """Drop the cached code tables so the next use reloads them."""
+    global _code_tables
+    with _code_tables_lock:
+        _code_tables = None
+
+def get_valid_codes():
+    """Return a read-only view of the valid codes dictionary, loaded lazily and safe to share between threads."""
+    return MappingProxyType(get_code_tables()['valid_codes'])
+
+def get_country_code_index():
+    """Return the country code index, built lazily."""
+    return get_code_tables()['country_code_index']
+
+def __getattr__(name):
+    # VALID_CODES and COUNTRY_CODE_INDEX stay importable but are only loaded when first accessed
+    if name == 'VALID_CODES':
+        return get_valid_codes()
+    if name == 'COUNTRY_CODE_INDEX':
+        return get_country_code_index()
+    if name == 'np':
+        return _get_numpy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _crc32_check_digit(input_data: str) -> int:
+    """Uncached CRC32 check digit, the function memoized by CheckDigitCache."""
+    return zlib.crc32(input_data.encode()) % 10
+
+class CheckDigitCache:
+    """Bounded, thread-safe memoization of CRC32 check digits keyed by field value.
+
+    Built on functools.lru_cache, whose C implementation is thread-safe and cheap enough
+    to beat recomputing the CRC. Once `capacity` fields are cached the least recently
+    used one is evicted; capacity=None keeps every field (no eviction).
+    """
+
+    def __init__(self, capacity: int = 65536):
+        if capacity is not None and capacity <= 0:
+            raise ValueError("Cache capacity must be positive or None")
+        self.capacity = capacity
+        self.lookup = functools.lru_cache(maxsize=capacity)(_crc32_check_digit)
+        # Misses and hits caused by prewarming, left out of stats()
+        self.prewarmed = 0
+        self.prewarm_hits = 0
+
+    def get(self, input_data: str) -> int:
+        """Return the check digit for input_data, computing and storing it on a miss."""
+        return self.lookup(input_data)
+
+    def prewarm_dates(self):
+        """Fill the cache with every calendar YYMMDD value (about 36,500 entries)."""
+        import datetime
+        day = datetime.date(2000, 1, 1)
+        end = datetime.date(2100, 1, 1)
+        one_day = datetime.timedelta(days=1)
+        before = self.lookup.cache_info()
+        while day < end:
+            self.lookup(day.strftime('%y%m%d'))
+            day += one_day
+        after = self.lookup.cache_info()
+        # Dates already cached are hits, not misses, so count what the lookups actually did
+        self.prewarmed += after.misses - before.misses
+        self.prewarm_hits += after.hits - before.hits
+
+    def clear(self):
+        self.lookup.cache_clear()
+        self.prewarmed = 0
+        self.prewarm_hits = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size (prewarming is not counted as misses)."""
+        info = self.lookup.cache_info()
+        return {
+            "capacity": self.capacity,
+            "size": info.currsize,
+            "hits": info.hits - self.prewarm_hits,
+            "misses": info.misses - self.prewarmed,
+            # Every miss inserts one entry, so whatever is no longer cached was evicted
+            "evictions": info.misses - info.currsize,
+        }
 
 def calculate_crc32_check_digit(input_data: str) -> int:
     """Calculate a check digit for the input data using CRC32."""
@@ -16,17 +264,206 @@ def calculate_crc32_check_digit(input_data: str) -> int:
     check_digit = checksum % 10  # Modulus 10 to get the check digit
     return check_digit
 
-def encode_mrz(data):
-    """Encode MRZ data based on user input, including calculated CRC32 check digits."""
+# Check-digit functions used by encode_mrz and validate_mrz for date fields and for the
+# other fields; enable_check_digit_cache swaps in the memoized lookup
+_check_digit_cache = None
+_date_check_digit = calculate_crc32_check_digit
+_field_check_digit = calculate_crc32_check_digit
+
+def enable_check_digit_cache(capacity: int = 65536, prewarm: bool = False, all_fields: bool = False,
+                             cache: CheckDigitCache = None):
+    """Memoize check digits in encode_mrz/validate_mrz through a new CheckDigitCache and return it.
+
+    Only the birth and expiration dates are cached by default, since passport and
+    personal numbers are nearly unique and would only churn the cache; all_fields=True
+    caches those too. Pass an existing `cache` to install it again with its contents.
+    """
+    global _check_digit_cache, _date_check_digit, _field_check_digit
+    if cache is None:
+        cache = CheckDigitCache(capacity)
+    if prewarm:
+        cache.prewarm_dates()
+    _check_digit_cache = cache
+    _date_check_digit = cache.lookup
+    _field_check_digit = cache.lookup if all_fields else calculate_crc32_check_digit
+    return cache
+
+def disable_check_digit_cache():
+    """Go back to computing every check digit directly."""
+    global _check_digit_cache, _date_check_digit, _field_check_digit
+    _check_digit_cache = None
+    _date_check_digit = calculate_crc32_check_digit
+    _field_check_digit = calculate_crc32_check_digit
+
+def _build_crc32_table():
+    """Build the 256-entry lookup table of the reflected CRC32 polynomial used by zlib."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xEDB88320 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+CRC32_TABLE = _build_crc32_table()
+
+def _field_column(fields, width: int = None):
+    """Return fields (a list of strings, a bytes-like buffer or a 2-D uint8 array) as a 2-D uint8 array.
+
+    Raises ValueError unless every field is `width` ASCII characters (or bytes) wide.
+    """
+    np = _get_numpy()
+    if isinstance(fields, np.ndarray):
+        if fields.dtype != np.uint8 or fields.ndim != 2 or (width is not None and fields.shape[1] != width):
+            raise ValueError(f"Expected a 2-D uint8 array of {width}-byte fields, got {fields.dtype} {fields.shape}")
+        return fields
+    if isinstance(fields, (list, tuple)):
+        if not fields:
+            return np.zeros((0, width or 0), dtype=np.uint8)
+        if width is None:
+            width = len(fields[0])
+        if any(len(field) != width for field in fields):
+            raise ValueError(f"Every field must be {width} characters wide")
+        fields = ''.join(fields)
+        if not fields.isascii():
+            raise ValueError("Fields must be ASCII")
+        fields = fields.encode()
+    fields = np.frombuffer(fields, dtype=np.uint8)
+    if not width or fields.size % width:
+        raise ValueError(f"Buffer size {fields.size} is not a multiple of the field width {width}")
+    return fields.reshape(-1, width)
+
+def calculate_crc32_check_digits(fields, width: int = None):
+    """Calculate CRC32 check digits for a column of same-width fields in table-driven NumPy passes.
+
+    `fields` is a list of strings, a contiguous bytes-like buffer of n * width bytes,
+    or a 2-D uint8 array with one field per row. Returns a uint8 array of check digits
+    identical to calculate_crc32_check_digit applied to each field. Raises ValueError if
+    the fields are not all `width` ASCII characters wide.
+    """
+    np = _get_numpy()
+    if np is None:
+        raise RuntimeError("calculate_crc32_check_digits requires NumPy")
+    column = _field_column(fields, width)
+    table = np.asarray(CRC32_TABLE, dtype=np.uint32)
+    crc = np.full(column.shape[0], 0xFFFFFFFF, dtype=np.uint32)
+    # One table lookup per byte position, applied to every field at once
+    for position in range(column.shape[1]):
+        crc = table[(crc ^ column[:, position]) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (crc % 10).astype(np.uint8)
+
+def _build_icao_weighted_tables():
+    """Build one 256-byte table per ICAO 9303 weight (7, 3, 1) mapping a character byte to value * weight % 10.
+
+    Digits are worth 0-9, A-Z 10-35 and the '<' filler 0; any other byte counts as 0.
+    """
+    values = [0] * 256
+    for digit in range(10):
+        values[ord('0') + digit] = digit
+    for letter in range(26):
+        values[ord('A') + letter] = 10 + letter
+    return values, tuple(bytes(value * weight % 10 for value in values) for weight in (7, 3, 1))
+
+ICAO_CHARACTER_VALUES, ICAO_WEIGHTED_TABLES = _build_icao_weighted_tables()
+
+def calculate_icao_check_digit(input_data: str) -> int:
+    """Calculate the ICAO 9303 7-3-1 check digit of the input data.
+
+    Each third of the characters is mapped through its weight's lookup table with
+    bytes.translate, so no per-character Python arithmetic is needed.
+    """
+    data = input_data.encode()
+    weight7, weight3, weight1 = ICAO_WEIGHTED_TABLES
+    weighted = data[0::3].translate(weight7) + data[1::3].translate(weight3) + data[2::3].translate(weight1)
+    return sum(weighted) % 10
+
+def calculate_icao_check_digits(fields, width: int = None):
+    """Calculate ICAO 9303 7-3-1 check digits for a column of same-width fields with NumPy.
+
+    Accepts the same inputs as calculate_crc32_check_digits and returns a uint8 array of
+    check digits identical to calculate_icao_check_digit applied to each field.
+    """
+    np = _get_numpy()
+    if np is None:
+        raise RuntimeError("calculate_icao_check_digits requires NumPy")
+    column = _field_column(fields, width)
+    values = np.asarray(ICAO_CHARACTER_VALUES, dtype=np.uint16)[column]
+    weights = np.resize(np.array([7, 3, 1], dtype=np.uint16), column.shape[1])
+    return ((values * weights).sum(axis=1, dtype=np.uint32) % 10).astype(np.uint8)
+
+class CheckDigitAlgorithm:
+    """A named check-digit scheme: a per-field function and a NumPy function over a column of fields."""
+
+    def __init__(self, name: str, check_digit, check_digits=None):
+        self.name = name
+        self.check_digit = check_digit
+        self.check_digits = check_digits
+
+    def __repr__(self):
+        return f"CheckDigitAlgorithm({self.name!r})"
+
+# Check-digit algorithms selectable through the `algorithm` argument of encode_mrz,
+# validate_mrz and the batch functions
+CHECK_DIGIT_ALGORITHMS = {}
+# Built-in algorithms have dedicated fast paths (the check-digit cache, the memory-mapped
+# CRC32 loop), so they cannot be replaced through the registry
+BUILTIN_CHECK_DIGIT_ALGORITHMS = ('crc32', 'icao')
+
+def register_check_digit_algorithm(name: str, check_digit, check_digits=None) -> CheckDigitAlgorithm:
+    """Register (or replace) a check-digit algorithm under name and return it.
+
+    check_digit maps a field string to an int 0-9; check_digits, optional, maps a
+    column of fields to a uint8 array for the vectorized paths. Raises ValueError for
+    the names of the built-in algorithms.
+    """
+    if name in BUILTIN_CHECK_DIGIT_ALGORITHMS and name in CHECK_DIGIT_ALGORITHMS:
+        raise ValueError(f"Cannot replace the built-in check digit algorithm {name}")
+    algorithm = CheckDigitAlgorithm(name, check_digit, check_digits)
+    CHECK_DIGIT_ALGORITHMS[name] = algorithm
+    return algorithm
+
+def get_check_digit_algorithm(name: str) -> CheckDigitAlgorithm:
+    """Return the registered check-digit algorithm called name."""
+    try:
+        return CHECK_DIGIT_ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown check digit algorithm: {name}") from None
+
+def _check_digit_functions(algorithm: str):
+    """Return the (field, date) check-digit functions for algorithm; crc32 goes through the optional cache."""
+    if algorithm == 'crc32':
+        return _field_check_digit, _date_check_digit
+    check_digit = get_check_digit_algorithm(algorithm).check_digit
+    return check_digit, check_digit
+
+def _batch_check_digits(algorithm: str):
+    """Return the NumPy column function of algorithm."""
+    check_digits = get_check_digit_algorithm(algorithm).check_digits
+    if check_digits is None:
+        raise ValueError(f"Check digit algorithm {algorithm} has no batch implementation")
+    return check_digits
+
+register_check_digit_algorithm('crc32', calculate_crc32_check_digit, calculate_crc32_check_digits)
+register_check_digit_algorithm('icao', calculate_icao_check_digit, calculate_icao_check_digits)
+
+def encode_mrz(data, algorithm: str = 'crc32'):
+    """Encode MRZ data based on user input, including check digits calculated with `algorithm` (CRC32 by default)."""
+    if _instrumentation is not None:
+        return _encode_mrz_instrumented(data, _instrumentation, algorithm)
     # Encode Line 1
     document_type ='p';
     name_field = f"{data['line1']['last_name']}<<{data['line1']['given_name']}".replace(" ", "<").ljust(39, '<')[:39]
     line1 = f"{document_type}<{data['line1']['issuing_country']}{name_field}"
-    # Calculate check digits using CRC32 for relevant fields
-    passport_check_digit = calculate_crc32_check_digit(data['line2']['passport_number'])
-    birth_check_digit = calculate_crc32_check_digit(data['line2']['birth_date'])
-    expiry_check_digit = calculate_crc32_check_digit(data['line2']['expiration_date'])
-    personal_number_check_digit = calculate_crc32_check_digit(data['line2']['personal_number']) if data['line2']['personal_number'] else '<'
+    # Calculate check digits for relevant fields
+    if algorithm == 'crc32':
+        field_check_digit, date_check_digit = _field_check_digit, _date_check_digit
+    else:
+        field_check_digit, date_check_digit = _check_digit_functions(algorithm)
+    passport_check_digit = field_check_digit(data['line2']['passport_number'])
+    birth_check_digit = date_check_digit(data['line2']['birth_date'])
+    expiry_check_digit = date_check_digit(data['line2']['expiration_date'])
+    personal_number_check_digit = field_check_digit(data['line2']['personal_number']) if data['line2']['personal_number'] else '<'
     # Encode Line 2
     passport_number = data['line2']['passport_number'].ljust(9, '<')[:9]
     country_code = data['line2']['country_code'].ljust(3, '<')[:3]
@@ -39,6 +476,125 @@ def encode_mrz(data):
 
     return line1+';'+line2
 
+# Stages of encode_mrz, called separately by the instrumented path so each can be timed;
+# encode_mrz keeps them inline because the extra calls would show up on every record
+
+def _encode_line1(data) -> str:
+    """Encode Line 1: document type, issuing country and the name field."""
+    document_type ='p';
+    name_field = f"{data['line1']['last_name']}<<{data['line1']['given_name']}".replace(" ", "<").ljust(39, '<')[:39]
+    return f"{document_type}<{data['line1']['issuing_country']}{name_field}"
+
+def _encode_check_digits(data, algorithm: str = 'crc32'):
+    """Calculate the (passport, birth, expiry, personal number) check digits of the line 2 fields."""
+    field_check_digit, date_check_digit = _check_digit_functions(algorithm)
+    passport_check_digit = field_check_digit(data['line2']['passport_number'])
+    birth_check_digit = date_check_digit(data['line2']['birth_date'])
+    expiry_check_digit = date_check_digit(data['line2']['expiration_date'])
+    personal_number_check_digit = field_check_digit(data['line2']['personal_number']) if data['line2']['personal_number'] else '<'
+    return passport_check_digit, birth_check_digit, expiry_check_digit, personal_number_check_digit
+
+def _encode_line2(data, check_digits) -> str:
+    """Encode Line 2 from the data and the digits returned by _encode_check_digits."""
+    passport_check_digit, birth_check_digit, expiry_check_digit, personal_number_check_digit = check_digits
+    passport_number = data['line2']['passport_number'].ljust(9, '<')[:9]
+    country_code = data['line2']['country_code'].ljust(3, '<')[:3]
+    birth_date = data['line2']['birth_date'].ljust(6, '<')[:6]
+    expiration_date = data['line2']['expiration_date'].ljust(6, '<')[:6]
+    personal_number = data['line2']['personal_number'].ljust(14, '<')[:14]
+
+    return (f"{passport_number}{passport_check_digit}{country_code}{birth_date}{birth_check_digit}"
+            f"{data['line2']['sex']}{expiration_date}{expiry_check_digit}{personal_number}{personal_number_check_digit}")
+
+# Encoded record layout for struct.pack_into: line 1 ('p<', issuing country, name), the
+# separator pad byte, then line 2 fields interleaved with their single-byte check digits
+RECORD_STRUCT = struct.Struct('2s3s39sx9sc3s6scc6sc14sc')
+# struct pads short fields with NUL bytes; MRZ pads them with '<'
+NUL_TO_FILLER = bytes.maketrans(b'\0', b'<')
+CHECK_DIGIT_BYTES = tuple(str(digit).encode() for digit in range(10))
+
+class MRZEncoder:
+    """Encode records straight into preallocated byte buffers, byte-identical to encode_mrz.
+
+    Each record is packed in one struct.pack_into call at a fixed offset of a reused
+    bytearray, with check digits computed on the field bytes, instead of assembling it
+    from a dozen temporary strings. Records that do not fit the fixed ASCII layout
+    (non-ASCII or NUL characters, an issuing country that is not three characters or a
+    sex field that is not one) are left to encode_mrz. Check digits are always CRC32.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray(RECORD_WIDTH)
+
+    def encode_into(self, data, out, offset: int = 0) -> bool:
+        """Write the 88-byte record for data into out[offset:offset + 88]; return False if it does not fit."""
+        line1 = data['line1']
+        line2 = data['line2']
+        issuing_country = line1['issuing_country']
+        sex = line2['sex']
+        name = f"{line1['last_name']}<<{line1['given_name']}"
+        passport_number = line2['passport_number']
+        birth_date = line2['birth_date']
+        expiration_date = line2['expiration_date']
+        personal_number = line2['personal_number']
+        fields = ''.join((issuing_country, name, passport_number, line2['country_code'], birth_date, sex,
+                          expiration_date, personal_number))
+        if len(issuing_country) != 3 or len(sex) != 1 or not fields.isascii() or '\0' in fields:
+            return False
+        if ' ' in name:
+            name = name.replace(' ', '<')
+        passport_number = passport_number.encode()
+        birth_date = birth_date.encode()
+        expiration_date = expiration_date.encode()
+        personal_number = personal_number.encode()
+        RECORD_STRUCT.pack_into(
+            out, offset, b'p<', issuing_country.encode(), name.encode(),
+            passport_number, CHECK_DIGIT_BYTES[zlib.crc32(passport_number) % 10],
+            line2['country_code'].encode(),
+            birth_date, CHECK_DIGIT_BYTES[zlib.crc32(birth_date) % 10],
+            sex.encode(),
+            expiration_date, CHECK_DIGIT_BYTES[zlib.crc32(expiration_date) % 10],
+            personal_number, CHECK_DIGIT_BYTES[zlib.crc32(personal_number) % 10] if personal_number else b'<')
+        out[offset:offset + RECORD_WIDTH] = out[offset:offset + RECORD_WIDTH].translate(NUL_TO_FILLER)
+        out[offset + LINE1_WIDTH] = ord(';')
+        return True
+
+    def encode_bytes(self, data) -> bytes:
+        """Return the encoded record as bytes, falling back to encode_mrz for records that do not fit."""
+        if self.encode_into(data, self.buffer):
+            return bytes(self.buffer)
+        return encode_mrz(data).encode()
+
+def encode_mrz_to_file(records, output_path: str, chunk_records: int = 4096):
+    """Encode decoded records into a text record file, one record per line, through a reused output buffer.
+
+    When every record fits the fixed layout the file is also a valid fixed-width record
+    file for validate_mrz_fixed_width. Returns the number of records written and how
+    many of them needed the encode_mrz fallback.
+    """
+    encoder = MRZEncoder()
+    chunk = bytearray(b'<' * RECORD_WIDTH + b'\n') * chunk_records
+    view = memoryview(chunk)
+    used = 0
+    written = 0
+    fallback = 0
+    with open(output_path, 'wb') as file:
+        for record in records:
+            if encoder.encode_into(record, chunk, used):
+                used += FIXED_RECORD_SIZE
+                if used == len(chunk):
+                    file.write(view[:used])
+                    used = 0
+            else:
+                file.write(view[:used])
+                used = 0
+                file.write(encode_mrz(record).encode() + b'\n')
+                fallback += 1
+            written += 1
+        file.write(view[:used])
+    view.release()
+    return {"written": written, "fallback": fallback}
+
 def parse_mrz_line1(line1: str):
     """Parse line 1 of MRZ to extract document type, country, and name fields."""
     document_type = line1[0]
@@ -60,30 +616,55 @@ def parse_mrz_line2(line2: str):
     personal_number_check_digit = line2[-1]
     return passport_number, passport_check_digit, country, dob, dob_check_digit, sex, expiration_date, expiry_check_digit, personal_number, personal_number_check_digit
 
+def decode_mrz(line1: str, line2: str):
+    """Rebuild the decoded record that encode_mrz expects from a pair of MRZ lines."""
+    document_type, issuing_country, _ = parse_mrz_line1(line1)
+    last_name, _, given_name = line1[5:].partition('<<')
+    return {
+        "line1": {
+            "issuing_country": issuing_country,
+            "last_name": last_name.replace('<', ' ').strip(),
+            "given_name": given_name.replace('<', ' ').strip()
+        },
+        "line2": {
+            "passport_number": line2[0:9].rstrip('<'),
+            "country_code": line2[10:13],
+            "birth_date": line2[13:19],
+            "sex": line2[20],
+            "expiration_date": line2[21:27],
+            "personal_number": line2[28:42].rstrip('<')
+        }
+    }
+
 def validate_code(code: str) -> bool:
     """Validate if a code for country, place of birth, or issuing state is valid."""
-    return code in VALID_CODES
+    return code in get_country_code_index()
 
-def validate_mrz(line1: str, line2: str) -> bool:
+def validate_mrz(line1: str, line2: str, check_codes: bool = False, algorithm: str = 'crc32') -> bool:
+    if _instrumentation is not None:
+        return _validate_mrz_instrumented(line1, line2, check_codes, _instrumentation, algorithm)
       # Check if line2 has the expected length (e.g., 44 characters for a passport MRZ)
     if len(line2) < 43 or len(line2) > 43:  # Adjust the length based on the MRZ standard you're following
         return False
     """Validate the MRZ lines by checking that the check digits are correct."""
     document_type, country_line1, name = parse_mrz_line1(line1)
     # Validate country code in line 1 (issuing state)
-    #if not validate_code(country_line1):
-        #print(f"Invalid country code in line 1: {country_line1}")
-        #return False
+    if check_codes and country_line1 not in get_country_code_index():
+        return False
     # Parse line 2 fields
     passport_number, passport_check_digit, country_line2, dob, dob_check_digit, sex, expiration_date, expiry_check_digit, personal_number, personal_number_check_digit = parse_mrz_line2(line2)
-    #if not validate_code(country_line2):
-        #print(f"Invalid country code in line 2: {country_line2}")
-        #return False
+    # Validate country code in line 2 (nationality)
+    if check_codes and country_line2 not in get_country_code_index():
+        return False
    # Calculate check digits for each relevant field in line 2
-    calculated_passport_check_digit = int(calculate_crc32_check_digit(passport_number))
-    calculated_dob_check_digit = calculate_crc32_check_digit(dob)
-    calculated_expiry_check_digit = calculate_crc32_check_digit(expiration_date)
-    calculated_personal_number_check_digit = calculate_crc32_check_digit(personal_number)
+    if algorithm == 'crc32':
+        field_check_digit, date_check_digit = _field_check_digit, _date_check_digit
+    else:
+        field_check_digit, date_check_digit = _check_digit_functions(algorithm)
+    calculated_passport_check_digit = int(field_check_digit(passport_number))
+    calculated_dob_check_digit = date_check_digit(dob)
+    calculated_expiry_check_digit = date_check_digit(expiration_date)
+    calculated_personal_number_check_digit = field_check_digit(personal_number)
     # Validate all check digits from line 2
     return (
         int(calculated_passport_check_digit) == int(passport_check_digit) and
@@ -92,8 +673,263 @@ def validate_mrz(line1: str, line2: str) -> bool:
         int(calculated_personal_number_check_digit) == int(personal_number_check_digit)
     )
 
+# Stages of validate_mrz's check-digit test, called separately by the instrumented path
+
+def _line2_check_digits(line2_fields, algorithm: str = 'crc32'):
+    """Return the calculated and the recorded (passport, birth, expiry, personal number) check digits of line 2."""
+    (passport_number, passport_check_digit, country_line2, dob, dob_check_digit, sex, expiration_date,
+     expiry_check_digit, personal_number, personal_number_check_digit) = line2_fields
+    field_check_digit, date_check_digit = _check_digit_functions(algorithm)
+    calculated = (field_check_digit(passport_number), date_check_digit(dob), date_check_digit(expiration_date),
+                  field_check_digit(personal_number))
+    return calculated, (passport_check_digit, dob_check_digit, expiry_check_digit, personal_number_check_digit)
+
+def _check_digits_match(calculated, expected) -> bool:
+    """Compare check digits in order, stopping at the first mismatch; a non-digit reached first raises ValueError."""
+    return (
+        int(calculated[0]) == int(expected[0]) and
+        int(calculated[1]) == int(expected[1]) and
+        int(calculated[2]) == int(expected[2]) and
+        int(calculated[3]) == int(expected[3])
+    )
+
+# Result codes of validate_mrz_detailed, OR-ed together; MRZ_VALID means every check passed
+MRZ_VALID = 0
+MRZ_BAD_LENGTH = 1 << 0
+MRZ_BAD_FORMAT = 1 << 1
+MRZ_PASSPORT_CHECK_DIGIT = 1 << 2
+MRZ_BIRTH_CHECK_DIGIT = 1 << 3
+MRZ_EXPIRY_CHECK_DIGIT = 1 << 4
+MRZ_PERSONAL_NUMBER_CHECK_DIGIT = 1 << 5
+MRZ_NON_DIGIT_CHECK_CHARACTER = 1 << 6
+MRZ_INVALID_ISSUING_STATE = 1 << 7
+MRZ_INVALID_NATIONALITY = 1 << 8
+
+MRZ_FAILURE_NAMES = {
+    MRZ_BAD_LENGTH: 'bad_length',
+    MRZ_BAD_FORMAT: 'bad_format',
+    MRZ_PASSPORT_CHECK_DIGIT: 'passport_check_digit',
+    MRZ_BIRTH_CHECK_DIGIT: 'birth_check_digit',
+    MRZ_EXPIRY_CHECK_DIGIT: 'expiry_check_digit',
+    MRZ_PERSONAL_NUMBER_CHECK_DIGIT: 'personal_number_check_digit',
+    MRZ_NON_DIGIT_CHECK_CHARACTER: 'non_digit_check_character',
+    MRZ_INVALID_ISSUING_STATE: 'invalid_issuing_state',
+    MRZ_INVALID_NATIONALITY: 'invalid_nationality',
+}
+
+# (field start, field end, check digit position, failure bit) for each check digit in line 2
+LINE2_CHECK_FAILURES = tuple(field + (bit,) for field, bit in zip(LINE2_CHECKED_FIELDS, (
+    MRZ_PASSPORT_CHECK_DIGIT, MRZ_BIRTH_CHECK_DIGIT, MRZ_EXPIRY_CHECK_DIGIT, MRZ_PERSONAL_NUMBER_CHECK_DIGIT)))
+CHECK_DIGIT_CHARS = '0123456789'
+
+def validate_mrz_detailed(line1: str, line2: str, check_codes: bool = False, algorithm: str = 'crc32') -> int:
+    """Validate the MRZ lines in one pass and return a bitmask of every failed check (MRZ_VALID if none).
+
+    Never raises: a non-digit check character sets its field's bit plus
+    MRZ_NON_DIGIT_CHECK_CHARACTER. A line 2 of the wrong length only sets MRZ_BAD_LENGTH,
+    since its fields cannot be located. MRZ_VALID corresponds to validate_mrz returning True.
+    """
+    if len(line2) != LINE2_WIDTH:
+        return MRZ_BAD_LENGTH
+    code = MRZ_VALID
+    if check_codes:
+        country_code_index = get_country_code_index()
+        if line1[2:5] not in country_code_index:
+            code |= MRZ_INVALID_ISSUING_STATE
+        if line2[10:13] not in country_code_index:
+            code |= MRZ_INVALID_NATIONALITY
+    if algorithm == 'crc32':
+        field_check_digit, date_check_digit = _field_check_digit, _date_check_digit
+    else:
+        field_check_digit = date_check_digit = get_check_digit_algorithm(algorithm).check_digit
+    # Passport number, birth date, expiry date, personal number: the dates go through the date cache
+    for (start, end, check_position, bit), check_digit in zip(LINE2_CHECK_FAILURES, (
+            field_check_digit, date_check_digit, date_check_digit, field_check_digit)):
+        check_character = line2[check_position]
+        if CHECK_DIGIT_CHARS[check_digit(line2[start:end])] != check_character:
+            code |= bit
+            if check_character not in CHECK_DIGIT_CHARS:
+                code |= MRZ_NON_DIGIT_CHECK_CHARACTER
+    return code
+
+def validate_mrz_record_detailed(entry: str, check_codes: bool = False, algorithm: str = 'crc32') -> int:
+    """validate_mrz_detailed for a 'line1;line2' record; a record without separator is MRZ_BAD_FORMAT."""
+    parts = entry.split(';')
+    if len(parts) < 2:
+        return MRZ_BAD_FORMAT
+    return validate_mrz_detailed(parts[0], parts[1], check_codes, algorithm)
+
+def describe_mrz_failures(code: int):
+    """Return the names of the failures set in a validate_mrz_detailed result code."""
+    return [name for bit, name in MRZ_FAILURE_NAMES.items() if code & bit]
+
+def failure_histogram(codes):
+    """Count failures by name over many result codes; records with no failure count as 'valid'.
+
+    Codes are first counted by value, so decoding the bits costs one pass per distinct code.
+    """
+    if hasattr(codes, 'tolist'):
+        codes = codes.tolist()
+    histogram = {}
+    for code, count in Counter(codes).items():
+        for name in describe_mrz_failures(code) if code != MRZ_VALID else ['valid']:
+            histogram[name] = histogram.get(name, 0) + count
+    return histogram
+
+class MRTDStats:
+    """Thread-safe stage counters, cumulative stage timers and invalid-reason counts."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.results = {}
+            self.invalid_reasons = {}
+            self.stage_calls = {}
+            self.stage_seconds = {}
+
+    def record(self, operation: str, stage_timings, result: str = None, reasons=()):
+        """Record one encode/validate call: its (stage, seconds) pairs, result and invalid reasons."""
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            for stage, seconds in stage_timings:
+                key = (operation, stage)
+                self.stage_calls[key] = self.stage_calls.get(key, 0) + 1
+                self.stage_seconds[key] = self.stage_seconds.get(key, 0.0) + seconds
+            if result is not None:
+                self.results[result] = self.results.get(result, 0) + 1
+            for reason in reasons:
+                self.invalid_reasons[reason] = self.invalid_reasons.get(reason, 0) + 1
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of all counters."""
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "results": dict(self.results),
+                "invalid_reasons": dict(self.invalid_reasons),
+                "stages": {f"{operation}.{stage}": {"calls": calls, "seconds": self.stage_seconds[(operation, stage)]}
+                           for (operation, stage), calls in self.stage_calls.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self, prefix: str = 'mrtd') -> str:
+        """Render the counters in the Prometheus text exposition format."""
+        with self.lock:
+            lines = [f"# TYPE {prefix}_calls_total counter"]
+            lines += [f'{prefix}_calls_total{{operation="{operation}"}} {count}' for operation, count in self.calls.items()]
+            lines.append(f"# TYPE {prefix}_validation_results_total counter")
+            lines += [f'{prefix}_validation_results_total{{result="{result}"}} {count}' for result, count in self.results.items()]
+            lines.append(f"# TYPE {prefix}_invalid_reasons_total counter")
+            lines += [f'{prefix}_invalid_reasons_total{{reason="{reason}"}} {count}'
+                      for reason, count in self.invalid_reasons.items()]
+            lines.append(f"# TYPE {prefix}_stage_calls_total counter")
+            lines += [f'{prefix}_stage_calls_total{{operation="{operation}",stage="{stage}"}} {count}'
+                      for (operation, stage), count in self.stage_calls.items()]
+            lines.append(f"# TYPE {prefix}_stage_seconds_total counter")
+            lines += [f'{prefix}_stage_seconds_total{{operation="{operation}",stage="{stage}"}} {seconds:.9f}'
+                      for (operation, stage), seconds in self.stage_seconds.items()]
+        return '\n'.join(lines) + '\n'
+
+# Active instrumentation, None while disabled so encode_mrz/validate_mrz only pay one global check
+_instrumentation = None
+
+def enable_instrumentation():
+    """Start collecting stage timings and invalid reasons for encode_mrz and validate_mrz."""
+    global _instrumentation
+    _instrumentation = MRTDStats()
+    return _instrumentation
+
+def disable_instrumentation():
+    """Stop collecting and return the stats collected so far (or None)."""
+    global _instrumentation
+    stats = _instrumentation
+    _instrumentation = None
+    return stats
+
+def get_instrumentation_stats():
+    """Return the active MRTDStats, or None while instrumentation is disabled."""
+    return _instrumentation
+
+def dump_instrumentation_stats(output_path: str, output_format: str = 'json'):
+    """Write the active stats to a file as 'json' or 'prometheus' text."""
+    if _instrumentation is None:
+        raise RuntimeError("Instrumentation is not enabled")
+    if output_format not in ('json', 'prometheus'):
+        raise ValueError(f"Unsupported stats format: {output_format}")
+    with open(output_path, 'w') as file:
+        file.write(_instrumentation.to_json() if output_format == 'json' else _instrumentation.to_prometheus())
+
+def _encode_mrz_instrumented(data, stats: MRTDStats, algorithm: str = 'crc32'):
+    """encode_mrz with per-stage timing, used while instrumentation is enabled."""
+    clock = time.perf_counter
+    started = clock()
+    line1 = _encode_line1(data)
+    line1_done = clock()
+    check_digits = _encode_check_digits(data, algorithm)
+    check_digits_done = clock()
+    line2 = _encode_line2(data, check_digits)
+    line2_done = clock()
+    stats.record('encode', (('line1', line1_done - started), ('check_digits', check_digits_done - line1_done),
+                            ('line2', line2_done - check_digits_done)))
+    return line1 + ';' + line2
+
+def _validate_mrz_instrumented(line1: str, line2: str, check_codes: bool, stats: MRTDStats,
+                               algorithm: str = 'crc32') -> bool:
+    """validate_mrz with per-stage timing and invalid-reason counts, used while instrumentation is enabled.
+
+    Runs the same stages as validate_mrz and returns (and raises) exactly what it would.
+    Failed records are counted under every reason validate_mrz_detailed reports, not
+    just the first one.
+    """
+    clock = time.perf_counter
+    timings = []
+    started = clock()
+
+    def stage(name, func, *args):
+        nonlocal started
+        result = func(*args)
+        now = clock()
+        timings.append((name, now - started))
+        started = now
+        return result
+
+    def failed(result):
+        reasons = describe_mrz_failures(validate_mrz_detailed(line1, line2, check_codes, algorithm))
+        stats.record('validate', timings, result, reasons)
+
+    if not stage('length_check', lambda: len(line2) == LINE2_WIDTH):
+        failed('invalid')
+        return False
+    document_type, country_line1, name = stage('parse_line1', parse_mrz_line1, line1)
+    if check_codes and not stage('code_check_line1', validate_code, country_line1):
+        failed('invalid')
+        return False
+    line2_fields = stage('parse_line2', parse_mrz_line2, line2)
+    if check_codes and not stage('code_check_line2', validate_code, line2_fields[2]):
+        failed('invalid')
+        return False
+    calculated, expected = stage('check_digits', _line2_check_digits, line2_fields, algorithm)
+    try:
+        is_valid = stage('compare', _check_digits_match, calculated, expected)
+    except ValueError:
+        failed('error')
+        raise
+    if is_valid:
+        stats.record('validate', timings, 'valid')
+    else:
+        failed('invalid')
+    return is_valid
+
 def validate_mrz_from_json(file_path: str):
     """Load MRZ data from a JSON file and validate each MRZ entry."""
+    # The whole list is returned anyway, so one json.load beats the streaming reader,
+    # which is kept for iter_validate_mrz and summarize_mrz_validation
     with open(file_path, 'r') as file:
         mrz_data = json.load(file)
     results = []
@@ -109,6 +945,684 @@ def validate_mrz_from_json(file_path: str):
         })
     return results
 
+def _gzip_open(file_path: str, mode: str):
+    import gzip
+    return gzip.open(file_path, mode)
+
+def _lzma_open(file_path: str, mode: str):
+    import lzma
+    return lzma.open(file_path, mode)
+
+# Stdlib compression supported for record files, selected explicitly or by file suffix;
+# the compression modules are only imported when such a file is opened
+COMPRESSION_OPENERS = {'gzip': _gzip_open, 'lzma': _lzma_open}
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.xz': 'lzma', '.lzma': 'lzma'}
+
+def detect_compression(file_path: str):
+    """Return 'gzip' or 'lzma' for compressed record files (by suffix), None otherwise."""
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if file_path.endswith(suffix):
+            return compression
+    return None
+
+def open_record_file(file_path: str, mode: str = 'r', compression: str = None):
+    """Open a record file, transparently (de)compressing gzip or lzma files; text mode unless mode has 'b'."""
+    compression = compression or detect_compression(file_path)
+    if compression is None:
+        return open(file_path, mode)
+    if compression not in COMPRESSION_OPENERS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return COMPRESSION_OPENERS[compression](file_path, mode if 'b' in mode else mode + 't')
+
+def detect_record_format(file_path: str) -> str:
+    """Guess the record file format ('json', 'jsonl' or 'text') from the file extension."""
+    compression = detect_compression(file_path)
+    if compression is not None:
+        file_path = os.path.splitext(file_path)[0]
+    if file_path.endswith('.jsonl'):
+        return 'jsonl'
+    if file_path.endswith('.json'):
+        return 'json'
+    return 'text'
+
+def iter_json_array(file, key: str, chunk_size: int = 65536):
+    """Yield the items of the JSON array stored under `key` without loading the whole file."""
+    decoder = json.JSONDecoder()
+    array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ''
+    eof = False
+    # Read until the opening bracket of the array has been seen
+    while True:
+        match = array_start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if eof:
+            raise ValueError(f"Key '{key}' with an array value not found")
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+    pos = 0
+    while True:
+        # Skip separators between items
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Buffer exhausted", buffer, pos)
+            item, end = decoder.raw_decode(buffer, pos)
+            # An item touching the end of the buffer may continue in the next chunk
+            if end < len(buffer) or eof:
+                yield item
+                pos = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+def iter_encoded_records(file_path: str, file_format: str = None, compression: str = None):
+    """Yield encoded 'line1;line2' records one at a time from a JSON, JSON Lines or text file."""
+    file_format = file_format or detect_record_format(file_path)
+    with open_record_file(file_path, compression=compression) as file:
+        if file_format == 'json':
+            yield from iter_json_array(file, 'records_encoded')
+        elif file_format == 'jsonl':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        elif file_format == 'text':
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield line
+        else:
+            raise ValueError(f"Unsupported record format: {file_format}")
+
+def iter_validate_mrz(file_path: str, file_format: str = None):
+    """Lazily validate each encoded record of a file, yielding one result dict at a time."""
+    for entry in iter_encoded_records(file_path, file_format):
+        parts = entry.split(';')
+        line1 = parts[0]
+        line2 = parts[1]
+        yield {
+            "line1": line1,
+            "line2": line2,
+            "is_valid": validate_mrz(line1, line2)
+        }
+
+def summarize_mrz_validation(file_path: str, file_format: str = None, workers: int = 1, chunk_size: int = 1000,
+                             check_codes: bool = False, algorithm: str = 'crc32'):
+    """Validate a record file in streaming mode and return valid/invalid counts plus the invalid records."""
+    summary = {"valid": 0, "invalid": 0, "invalid_records": []}
+    records = iter_encoded_records(file_path, file_format)
+    validate_chunk = _validate_chunk
+    if check_codes or algorithm != 'crc32':
+        validate_chunk = partial(_validate_chunk, check_codes=check_codes, algorithm=algorithm)
+    for chunk, results in map_record_chunks(validate_chunk, records, workers, chunk_size):
+        for entry, is_valid in zip(chunk, results):
+            if is_valid:
+                summary['valid'] += 1
+            else:
+                parts = entry.split(';')
+                summary['invalid'] += 1
+                summary['invalid_records'].append({
+                    "line1": parts[0],
+                    "line2": parts[1],
+                    "is_valid": is_valid
+                })
+    return summary
+
+# Bump whenever a change to the check-digit or validation logic can change a stored result
+VALIDATION_LOGIC_VERSION = 1
+
+def validation_version(check_codes: bool = False, algorithm: str = 'crc32') -> str:
+    """Return the stamp identifying the logic that produced a validation result.
+
+    The stamp names the check-digit algorithm. With check_codes it also covers the
+    country code table in use, so editing valid_codes.json invalidates results that
+    depended on it.
+    """
+    import hashlib
+    if not check_codes:
+        return f"{VALIDATION_LOGIC_VERSION}:{algorithm}:no-codes"
+    codes_digest = hashlib.blake2b(get_country_code_index().to_bytes(), digest_size=8).hexdigest()
+    return f"{VALIDATION_LOGIC_VERSION}:{algorithm}:codes-{codes_digest}"
+
+class ValidationIndex:
+    """Persistent sqlite index of chunk validation summaries keyed by a hash of each chunk's records.
+
+    The index remembers the version stamp its results were computed under; opening it
+    with a different stamp drops every stored result.
+    """
+
+    def __init__(self, path: str, version: str = None):
+        import sqlite3
+        self.path = path
+        self.version = version if version is not None else validation_version()
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS chunks (digest BLOB PRIMARY KEY, valid INTEGER NOT NULL, "
+                                "duplicates INTEGER NOT NULL, invalid_records TEXT NOT NULL) WITHOUT ROWID")
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != self.version:
+            self.connection.execute("DELETE FROM chunks")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+        self.connection.commit()
+
+    @staticmethod
+    def chunk_key(chunk) -> bytes:
+        """Return the 16-byte BLAKE2b digest identifying a chunk of 'line1;line2' records."""
+        import hashlib
+        return hashlib.blake2b('\n'.join(chunk).encode(), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        """Return the stored (valid, duplicates, invalid records) of a chunk, or None."""
+        row = self.connection.execute("SELECT valid, duplicates, invalid_records FROM chunks WHERE digest = ?",
+                                      (key,)).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def put(self, key: bytes, result):
+        """Store the (valid, duplicates, invalid records) of a chunk; call commit() to persist it."""
+        valid, duplicates, invalid_records = result
+        self.connection.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                                (key, valid, duplicates, json.dumps(invalid_records)))
+
+    def commit(self):
+        self.connection.commit()
+
+    def clear(self):
+        self.connection.execute("DELETE FROM chunks")
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _summarize_chunks(chunks, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Validate chunks with duplicates dropped, returning (valid, duplicates, invalid records) per chunk.
+
+    Runs inside pool workers; uses validate_mrz_record_detailed, so no record raises.
+    """
+    results = []
+    for chunk in chunks:
+        unique = dict.fromkeys(chunk)
+        invalid = [entry for entry in unique if validate_mrz_record_detailed(entry, check_codes, algorithm) != MRZ_VALID]
+        results.append((len(unique) - len(invalid), len(chunk) - len(unique), invalid))
+    return results
+
+def summarize_mrz_validation_incremental(file_path: str, index_path: str, file_format: str = None, workers: int = 1,
+                                         chunk_size: int = 1000, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Like summarize_mrz_validation, but reuse the stored result of every unchanged chunk of the file.
+
+    Records are read in chunks of `chunk_size`, and each chunk is looked up in the index
+    at `index_path` by one hash of its records. Only new or changed chunks are validated,
+    with exact duplicates within a chunk dropped. Inserting or deleting records shifts
+    every later chunk, so those are validated again. The summary also reports how many
+    duplicates were dropped and how many records came from the index.
+    """
+    summary = {"valid": 0, "invalid": 0, "invalid_records": [], "duplicates": 0, "cached": 0}
+    # Chunks as [key, result] in input order; result stays None until validated
+    pending = deque()
+    unresolved = deque()
+
+    def add(result):
+        valid, duplicates, invalid_records = result
+        summary['valid'] += valid
+        summary['invalid'] += len(invalid_records)
+        summary['duplicates'] += duplicates
+        for entry in invalid_records:
+            parts = entry.split(';')
+            summary['invalid_records'].append({
+                "line1": parts[0],
+                "line2": parts[1] if len(parts) > 1 else '',
+                "is_valid": False
+            })
+
+    def summarize_resolved():
+        while pending and pending[0][1] is not None:
+            add(pending.popleft()[1])
+
+    def missing_chunks(index):
+        for chunk in iter_chunks(iter_encoded_records(file_path, file_format), chunk_size):
+            key = ValidationIndex.chunk_key(chunk)
+            item = [key, index.get(key)]
+            pending.append(item)
+            if item[1] is None:
+                unresolved.append(item)
+                yield chunk
+            else:
+                summary['cached'] += len(chunk)
+                summarize_resolved()
+
+    summarize = partial(_summarize_chunks, check_codes=check_codes, algorithm=algorithm)
+    with ValidationIndex(index_path, validation_version(check_codes, algorithm)) as index:
+        # One chunk per task, so each result lines up with one index entry
+        for _, results in map_record_chunks(summarize, missing_chunks(index), workers, chunk_size=1):
+            item = unresolved.popleft()
+            item[1] = results[0]
+            index.put(*item)
+            summarize_resolved()
+        index.commit()
+        summarize_resolved()
+    return summary
+
+def _validate_line2_rows(rows, check_digits=calculate_crc32_check_digits):
+    """Validate the four check digits of a 2-D uint8 array of 43-byte line 2 rows."""
+    np = _get_numpy()
+    is_valid = np.ones(rows.shape[0], dtype=bool)
+    for start, end, check_position in LINE2_CHECKED_FIELDS:
+        expected = check_digits(rows[:, start:end])
+        # Non-digit check characters fall outside 0..9 and never match
+        is_valid &= rows[:, check_position] - ord('0') == expected
+    return is_valid
+
+def validate_mrz_vectorized(records, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Validate many 'line1;line2' records with the NumPy check-digit engine.
+
+    Records in the fixed 44 + 1 + 43 layout are validated column-wise in one pass;
+    any other record falls back to validate_mrz_record_detailed. Unlike validate_mrz,
+    a non-digit check character or a missing separator makes the record invalid
+    instead of raising.
+    """
+    np = _get_numpy()
+    records = list(records)
+    is_valid = np.zeros(len(records), dtype=bool)
+    fixed = [i for i, entry in enumerate(records)
+             if len(entry) == RECORD_WIDTH and entry[LINE1_WIDTH] == ';' and entry.isascii()]
+    if fixed:
+        data = ''.join([records[i] for i in fixed]).encode()
+        rows = np.frombuffer(data, dtype=np.uint8).reshape(len(fixed), RECORD_WIDTH)
+        is_valid[fixed] = _validate_fixed_rows(rows, _batch_check_digits(algorithm),
+                                               get_country_code_index() if check_codes else None)
+    if len(fixed) < len(records):
+        fixed_set = set(fixed)
+        for i, entry in enumerate(records):
+            if i not in fixed_set:
+                is_valid[i] = validate_mrz_record_detailed(entry, check_codes, algorithm) == MRZ_VALID
+    return is_valid
+
+def _validate_fixed_rows(rows, check_digits, country_code_index=None):
+    """Validate a 2-D uint8 array of fixed-layout records, checking country codes when an index is given."""
+    is_valid = _validate_line2_rows(rows[:, LINE1_WIDTH + 1:RECORD_WIDTH], check_digits)
+    if country_code_index is not None:
+        is_valid &= country_code_index.mask(rows[:, 2:5])
+        is_valid &= country_code_index.mask(rows[:, LINE1_WIDTH + 11:LINE1_WIDTH + 14])
+    return is_valid
+
+def validate_mrz_buffer(buffer, record_size: int = FIXED_RECORD_SIZE, threads: int = None, chunk_records: int = 65536,
+                        check_codes: bool = False, algorithm: str = 'crc32', executor=None):
+    """Validate a contiguous block of fixed-layout records, returning a boolean array, one entry per record.
+
+    `buffer` (bytes, mmap, memoryview, ...) holds `record_size`-byte records, viewed without
+    copying and validated with NumPy in chunks on `threads` threads or on a shared `executor`.
+    Queued chunks run inline when the caller waits, so tasks on that pool may call it too.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    np = _get_numpy()
+    if np is None:
+        raise RuntimeError("validate_mrz_buffer requires NumPy")
+    if record_size < RECORD_WIDTH:
+        raise ValueError(f"Records must be at least {RECORD_WIDTH} bytes")
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if data.size % record_size:
+        raise ValueError(f"Buffer size {data.size} is not a multiple of the record size {record_size}")
+    rows = data.reshape(-1, record_size)
+    # Resolve the shared, lazily loaded tables once, before any worker thread needs them
+    check_digits = _batch_check_digits(algorithm)
+    country_code_index = get_country_code_index() if check_codes else None
+    is_valid = np.empty(len(rows), dtype=bool)
+
+    def validate_chunk(start):
+        # Every chunk writes a disjoint slice of the result, so the threads share nothing mutable
+        end = start + chunk_records
+        is_valid[start:end] = _validate_fixed_rows(rows[start:end], check_digits, country_code_index)
+
+    starts = range(0, len(rows), chunk_records)
+    if executor is None and (threads == 1 or len(starts) <= 1):
+        for start in starts:
+            validate_chunk(start)
+    elif executor is not None:
+        futures = [(start, executor.submit(validate_chunk, start)) for start in starts]
+        # Chunks no worker has picked up yet run here, so a caller that is itself a task of
+        # `executor` never waits on work queued behind it; only chunks already running are awaited
+        for start, future in reversed(futures):
+            if future.cancel():
+                validate_chunk(start)
+        for _, future in futures:
+            if not future.cancelled():
+                future.result()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(validate_chunk, starts))
+    return is_valid
+
+def convert_to_fixed_width(input_path: str, output_path: str, file_format: str = None):
+    """Convert an encoded record file into the fixed-width format read by validate_mrz_fixed_width.
+
+    Records that do not fit the 44 + 1 + 43 ASCII layout cannot be stored and are
+    returned in the 'skipped' list of the result instead.
+    """
+    written = 0
+    skipped = []
+    with open(output_path, 'wb') as output:
+        for entry in iter_encoded_records(input_path, file_format):
+            if len(entry) == RECORD_WIDTH and entry[LINE1_WIDTH] == ';' and entry.isascii():
+                output.write(entry.encode() + b'\n')
+                written += 1
+            else:
+                skipped.append(entry)
+    return {"written": written, "skipped": skipped}
+
+def validate_mrz_fixed_width(file_path: str, vectorized: bool = False, threads: int = 1):
+    """Validate a fixed-width record file through a memory map, returning the same summary as summarize_mrz_validation.
+
+    Check digits are computed directly on memoryview slices of the mapped file, so only
+    invalid records are ever turned into strings. With vectorized=True the mapped buffer
+    is validated column-wise by validate_mrz_buffer instead, on `threads` threads.
+    """
+    import mmap
+    np = _get_numpy()
+    summary = {"valid": 0, "invalid": 0, "invalid_records": []}
+    if os.path.getsize(file_path) == 0:
+        return summary
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        records = len(mapped) // FIXED_RECORD_SIZE
+        # Every record must have its ';' and its '\n' in place, or a file of the right size (say with CRLF
+        # line ends) would be read out of step; each check is one strided copy of one byte per record
+        if (len(mapped) % FIXED_RECORD_SIZE
+                or mapped[LINE1_WIDTH::FIXED_RECORD_SIZE].count(b';') != records
+                or mapped[RECORD_WIDTH::FIXED_RECORD_SIZE].count(b'\n') != records):
+            raise ValueError(f"{file_path} is not a fixed-width record file")
+        view = memoryview(mapped)
+        try:
+            if vectorized:
+                is_valid = validate_mrz_buffer(view, threads=threads)
+                invalid_offsets = (np.flatnonzero(~is_valid) * FIXED_RECORD_SIZE).tolist()
+            else:
+                invalid_offsets = []
+                for offset in range(0, len(mapped), FIXED_RECORD_SIZE):
+                    line2 = offset + LINE1_WIDTH + 1
+                    for start, end, check_position in LINE2_CHECKED_FIELDS:
+                        if zlib.crc32(view[line2 + start:line2 + end]) % 10 != mapped[line2 + check_position] - 48:
+                            invalid_offsets.append(offset)
+                            break
+            for offset in invalid_offsets:
+                summary['invalid_records'].append({
+                    "line1": bytes(view[offset:offset + LINE1_WIDTH]).decode('ascii', 'replace'),
+                    "line2": bytes(view[offset + LINE1_WIDTH + 1:offset + RECORD_WIDTH]).decode('ascii', 'replace'),
+                    "is_valid": False
+                })
+            summary['invalid'] = len(invalid_offsets)
+            summary['valid'] = records - len(invalid_offsets)
+        finally:
+            view.release()
+    return summary
+
+class MRZBatch:
+    """Columnar struct-of-arrays container for encoded MRZ records (requires NumPy).
+
+    Every field is kept as a contiguous (n, width) uint8 column, so a batch costs about
+    87 bytes per record and can be validated, filtered and exported without creating
+    per-record Python objects.
+    """
+
+    # (column name, offset in the 88-byte 'line1;line2' record, width)
+    COLUMNS = (
+        ('document_type', 0, 1),
+        ('filler', 1, 1),
+        ('issuing_country', 2, 3),
+        ('name', 5, 39),
+        ('passport_number', 45, 9),
+        ('passport_check_digit', 54, 1),
+        ('country', 55, 3),
+        ('birth_date', 58, 6),
+        ('birth_check_digit', 64, 1),
+        ('sex', 65, 1),
+        ('expiration_date', 66, 6),
+        ('expiry_check_digit', 72, 1),
+        ('personal_number', 73, 14),
+        ('personal_number_check_digit', 87, 1),
+    )
+
+    # (field column, number of leading bytes covered by the check digit, check digit column)
+    CHECKED_COLUMNS = (
+        ('passport_number', 9, 'passport_check_digit'),
+        ('birth_date', 6, 'birth_check_digit'),
+        ('expiration_date', 6, 'expiry_check_digit'),
+        ('personal_number', 9, 'personal_number_check_digit'),
+    )
+
+    def __init__(self, columns, skipped=None):
+        np = _get_numpy()
+        if np is None:
+            raise RuntimeError("MRZBatch requires NumPy")
+        self.columns = columns
+        self.skipped = skipped if skipped is not None else []
+
+    @classmethod
+    def from_rows(cls, rows, skipped=None):
+        """Build a batch from a 2-D uint8 array whose rows start with the 88-byte record layout."""
+        np = _get_numpy()
+        columns = {name: np.ascontiguousarray(rows[:, offset:offset + width])
+                   for name, offset, width in cls.COLUMNS}
+        return cls(columns, skipped)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a batch in one pass from encoded 'line1;line2' records.
+
+        Records that do not fit the fixed layout are kept in the 'skipped' list.
+        """
+        np = _get_numpy()
+        if np is None:
+            raise RuntimeError("MRZBatch requires NumPy")
+        fixed = []
+        skipped = []
+        for entry in records:
+            if len(entry) == RECORD_WIDTH and entry[LINE1_WIDTH] == ';' and entry.isascii():
+                fixed.append(entry)
+            else:
+                skipped.append(entry)
+        rows = np.frombuffer(''.join(fixed).encode(), dtype=np.uint8).reshape(len(fixed), RECORD_WIDTH)
+        return cls.from_rows(rows, skipped)
+
+    @classmethod
+    def from_fixed_width(cls, file_path: str):
+        """Build a batch from a file written by convert_to_fixed_width."""
+        np = _get_numpy()
+        if np is None:
+            raise RuntimeError("MRZBatch requires NumPy")
+        rows = np.fromfile(file_path, dtype=np.uint8)
+        if rows.size % FIXED_RECORD_SIZE:
+            raise ValueError(f"{file_path} is not a fixed-width record file")
+        return cls.from_rows(rows.reshape(-1, FIXED_RECORD_SIZE))
+
+    def __len__(self):
+        return self.columns['document_type'].shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """Total number of bytes held by the columns."""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def field(self, name: str, index: int) -> str:
+        """Return a single field of a single record as a string."""
+        return self.columns[name][index].tobytes().decode()
+
+    def validate(self, check_codes: bool = False, algorithm: str = 'crc32'):
+        """Validate every record's check digits (and optionally country codes), returning a boolean array."""
+        np = _get_numpy()
+        check_digits = _batch_check_digits(algorithm)
+        is_valid = np.ones(len(self), dtype=bool)
+        for field_name, width, check_name in self.CHECKED_COLUMNS:
+            expected = check_digits(self.columns[field_name][:, :width])
+            is_valid &= self.columns[check_name][:, 0] - ord('0') == expected
+        if check_codes:
+            country_code_index = get_country_code_index()
+            is_valid &= country_code_index.mask(self.columns['issuing_country'])
+            is_valid &= country_code_index.mask(self.columns['country'])
+        return is_valid
+
+    def validate_detailed(self, check_codes: bool = False, algorithm: str = 'crc32'):
+        """Return validate_mrz_detailed result codes for every record as a uint16 array."""
+        np = _get_numpy()
+        check_digits = _batch_check_digits(algorithm)
+        codes = np.zeros(len(self), dtype=np.uint16)
+        for (field_name, width, check_name), (_, _, _, bit) in zip(self.CHECKED_COLUMNS, LINE2_CHECK_FAILURES):
+            check_values = self.columns[check_name][:, 0] - ord('0')
+            failed = check_values != check_digits(self.columns[field_name][:, :width])
+            codes[failed] |= bit
+            # uint8 arithmetic wraps, so anything outside '0'..'9' ends up above 9
+            codes[failed & (check_values > 9)] |= MRZ_NON_DIGIT_CHECK_CHARACTER
+        if check_codes:
+            country_code_index = get_country_code_index()
+            codes[~country_code_index.mask(self.columns['issuing_country'])] |= MRZ_INVALID_ISSUING_STATE
+            codes[~country_code_index.mask(self.columns['country'])] |= MRZ_INVALID_NATIONALITY
+        return codes
+
+    def filter(self, mask):
+        """Return a new batch holding only the records selected by a boolean mask or index array."""
+        return MRZBatch({name: column[mask] for name, column in self.columns.items()})
+
+    def invalid(self, check_codes: bool = False, algorithm: str = 'crc32'):
+        """Return a new batch holding only the records that fail validation."""
+        return self.filter(~self.validate(check_codes, algorithm))
+
+    def country_mask(self, code: str, column: str = 'country'):
+        """Boolean mask of records whose 'country' (line 2) or 'issuing_country' (line 1) equals code."""
+        np = _get_numpy()
+        padded = np.frombuffer(code.ljust(3, '<')[:3].encode(), dtype=np.uint8)
+        return (self.columns[column] == padded).all(axis=1)
+
+    def by_country(self, code: str, column: str = 'country'):
+        """Return a new batch holding only the records for the given country code."""
+        return self.filter(self.country_mask(code, column))
+
+    def to_rows(self):
+        """Reassemble the records into an (n, 88) uint8 array."""
+        np = _get_numpy()
+        rows = np.empty((len(self), RECORD_WIDTH), dtype=np.uint8)
+        rows[:, LINE1_WIDTH] = ord(';')
+        for name, offset, width in self.COLUMNS:
+            rows[:, offset:offset + width] = self.columns[name]
+        return rows
+
+    def to_fixed_width_bytes(self) -> bytes:
+        """Export the batch in the fixed-width record file format."""
+        np = _get_numpy()
+        rows = np.empty((len(self), FIXED_RECORD_SIZE), dtype=np.uint8)
+        rows[:, :RECORD_WIDTH] = self.to_rows()
+        rows[:, RECORD_WIDTH] = ord('\n')
+        return rows.tobytes()
+
+    def write_fixed_width(self, file_path: str):
+        """Write the batch to a fixed-width record file."""
+        with open(file_path, 'wb') as file:
+            file.write(self.to_fixed_width_bytes())
+
+    def iter_records(self):
+        """Yield the records as 'line1;line2' strings."""
+        data = self.to_rows().tobytes()
+        for offset in range(0, len(data), RECORD_WIDTH):
+            yield data[offset:offset + RECORD_WIDTH].decode()
+
+def iter_chunks(records, chunk_size: int):
+    """Yield successive lists of at most chunk_size records from any iterable."""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _encode_chunk(records, algorithm: str = 'crc32'):
+    """Encode a chunk of decoded records (runs inside pool workers)."""
+    return [encode_mrz(record, algorithm) for record in records]
+
+def _validate_chunk(records, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Validate a chunk of 'line1;line2' records (runs inside pool workers)."""
+    results = []
+    for entry in records:
+        parts = entry.split(';')
+        results.append(validate_mrz(parts[0], parts[1], check_codes, algorithm))
+    return results
+
+def _validate_chunk_detailed(records, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Return validate_mrz_detailed result codes for a chunk of records (runs inside pool workers)."""
+    return [validate_mrz_record_detailed(entry, check_codes, algorithm) for entry in records]
+
+def _validate_chunk_vectorized(records, check_codes: bool = False, algorithm: str = 'crc32'):
+    """Validate a chunk of 'line1;line2' records with the NumPy engine (runs inside pool workers)."""
+    return validate_mrz_vectorized(records, check_codes, algorithm).tolist()
+
+def map_record_chunks(func, records, workers: int = None, chunk_size: int = 1000, executor=None):
+    """Apply func to chunks of records in a process pool, yielding (chunk, result) pairs in input order.
+
+    Pass an existing ProcessPoolExecutor as `executor` to reuse it instead of starting a
+    new pool for this call.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor is None and workers <= 1:
+        for chunk in iter_chunks(records, chunk_size):
+            yield chunk, func(chunk)
+        return
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from _map_record_chunks_on(executor, func, records, workers, chunk_size)
+    else:
+        yield from _map_record_chunks_on(executor, func, records, workers, chunk_size)
+
+def _map_record_chunks_on(executor, func, records, workers: int, chunk_size: int):
+    # Keep a bounded number of chunks in flight so memory does not grow with the input
+    pending = deque()
+    for chunk in iter_chunks(records, chunk_size):
+        pending.append((chunk, executor.submit(func, chunk)))
+        if len(pending) >= 2 * workers:
+            done_chunk, future = pending.popleft()
+            yield done_chunk, future.result()
+    while pending:
+        done_chunk, future = pending.popleft()
+        yield done_chunk, future.result()
+
+def encode_mrz_batch(records, workers: int = None, chunk_size: int = 1000, algorithm: str = 'crc32', executor=None):
+    """Encode many decoded records in parallel, returning encoded strings in input order."""
+    encode_chunk = partial(_encode_chunk, algorithm=algorithm) if algorithm != 'crc32' else _encode_chunk
+    return [encoded for _, results in map_record_chunks(encode_chunk, records, workers, chunk_size, executor)
+            for encoded in results]
+
+def validate_mrz_batch_detailed(records, workers: int = None, chunk_size: int = 1000, check_codes: bool = False,
+                                algorithm: str = 'crc32'):
+    """Return validate_mrz_detailed result codes for many 'line1;line2' records, in input order."""
+    validate_chunk = partial(_validate_chunk_detailed, check_codes=check_codes, algorithm=algorithm)
+    return [code for _, codes in map_record_chunks(validate_chunk, records, workers, chunk_size) for code in codes]
+
+def validate_mrz_batch(records, workers: int = None, chunk_size: int = 1000, vectorized: bool = False,
+                       check_codes: bool = False, algorithm: str = 'crc32', executor=None):
+    """Validate many 'line1;line2' records in parallel, returning booleans in input order."""
+    validate_chunk = _validate_chunk_vectorized if vectorized else _validate_chunk
+    if check_codes or algorithm != 'crc32':
+        validate_chunk = partial(validate_chunk, check_codes=check_codes, algorithm=algorithm)
+    return [is_valid for _, results in map_record_chunks(validate_chunk, records, workers, chunk_size, executor)
+            for is_valid in results]
+
 def read_user_data(file_path):
     """Read user data from a JSON file and return as a list of dictionaries."""
     with open(file_path, 'r') as file:
@@ -120,80 +1634,327 @@ def write_encoded_records(encoded_records, output_path):
     with open(output_path, 'w') as file:
         json.dump({'records_encoded': encoded_records}, file, indent=4)
 
-def measure_execution_times_encode_mrz(input_file, output_csv):
-    """Measure execution times for processing records and write results to a CSV."""
-    results = []
+def iter_decoded_records(file_path: str, file_format: str = None, compression: str = None):
+    """Yield decoded records one at a time from a JSON ('records_decoded') or JSON Lines file."""
+    file_format = file_format or detect_record_format(file_path)
+    with open_record_file(file_path, compression=compression) as file:
+        if file_format == 'json':
+            yield from iter_json_array(file, 'records_decoded')
+        elif file_format == 'jsonl':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported decoded record format: {file_format}")
 
-    # Process for record counts: 100, 1000, ..., 10000
-    for k in [100] + list(range(1000, 10001, 1000)):
-        # Measure time without tests
-        records = read_user_data(input_file)['records_decoded'][:k]
-        start_no_tests = time.perf_counter()
-        for record in records:
-            encode_mrz(record)
-        end_no_tests = time.perf_counter()
+class EncodedRecordWriter:
+    """Incrementally write encoded records as compact JSON or JSON Lines, optionally compressed.
+
+    Records are buffered and flushed every `buffer_records` records, so memory use does
+    not depend on how many records are written. JSON output keeps one record per line
+    inside the 'records_encoded' array, which iter_encoded_records reads back. Records go
+    to a temporary file next to output_path that replaces it only when the writer is
+    closed without an error, so a failed run never leaves a truncated output behind.
+    """
+
+    def __init__(self, output_path: str, file_format: str = None, compression: str = None,
+                 buffer_records: int = 1000):
+        self.file_format = file_format or detect_record_format(output_path)
+        if self.file_format not in ('json', 'jsonl', 'text'):
+            raise ValueError(f"Unsupported record format: {self.file_format}")
+        compression = compression or detect_compression(output_path)
+        if compression is not None and compression not in COMPRESSION_OPENERS:
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.output_path = output_path
+        # Same directory, so os.replace is atomic; opened normally, so the output gets the usual permissions
+        self.temp_path = f'{output_path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        self.file = open_record_file(self.temp_path, 'w', compression)
+        self.buffer_records = buffer_records
+        self.buffer = []
+        self.count = 0
+        if self.file_format == 'json':
+            self.file.write('{"records_encoded": [\n')
 
-        # Measure time with tests
-        start_with_tests = time.perf_counter()
+    def write(self, record: str):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.buffer_records:
+            self.flush()
+
+    def write_many(self, records):
         for record in records:
-            encoded_record = encode_mrz(record)
-            assert encoded_record is not None
-            assert isinstance(encoded_record, str)
-        end_with_tests = time.perf_counter()
+            self.write(record)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.file_format == 'text':
+            chunk = '\n'.join(self.buffer) + '\n'
+        elif self.file_format == 'jsonl':
+            chunk = '\n'.join(map(json.dumps, self.buffer)) + '\n'
+        else:
+            chunk = ',\n'.join(map(json.dumps, self.buffer))
+            if self.count:
+                chunk = ',\n' + chunk
+        self.file.write(chunk)
+        self.count += len(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        """Finish the output and move it into place."""
+        try:
+            self.flush()
+            if self.file_format == 'json':
+                self.file.write('\n]}\n')
+            self.file.close()
+        except BaseException:
+            self.abort()
+            raise
+        os.replace(self.temp_path, self.output_path)
+
+    def abort(self):
+        """Discard everything written so far, leaving any existing output file untouched."""
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
 
-        # Calculate execution times
-        exec_time_no_tests = end_no_tests - start_no_tests
-        exec_time_with_tests = end_with_tests - start_with_tests
+def encode_mrz_stream(input_path: str, output_path: str, input_format: str = None, output_format: str = None,
+                      compression: str = None, workers: int = 1, chunk_size: int = 1000):
+    """Encode a decoded record file into an encoded record file end to end in constant memory.
 
-        # Append results
-        results.append([k, exec_time_no_tests, exec_time_with_tests])
-        print(f"Processed {k} records: {exec_time_no_tests:.4f}s (no tests), {exec_time_with_tests:.4f}s (with tests)")
+    Decoded records are read incrementally, encoded chunk by chunk (in a process pool when
+    workers > 1) and written through an EncodedRecordWriter. Returns the number of records.
+    """
+    records = iter_decoded_records(input_path, input_format)
+    with EncodedRecordWriter(output_path, output_format, compression, chunk_size) as writer:
+        for _, encoded in map_record_chunks(_encode_chunk, records, workers, chunk_size):
+            writer.write_many(encoded)
+    return writer.count
+
+def time_repeated(func, repeats: int = 5, warmup: int = 1):
+    """Call func `warmup` times untimed, then `repeats` times timed; return the timings in seconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def timing_statistics(timings, records: int = None):
+    """Summarize repeated timings as median, quartiles, IQR and (optionally) records per second."""
+    import statistics
+    ordered = sorted(timings)
+    if len(ordered) > 1:
+        q1, median, q3 = statistics.quantiles(ordered, n=4, method='inclusive')
+    else:
+        q1 = median = q3 = ordered[0]
+    result = {
+        "runs": len(ordered),
+        "median": median,
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+    if records is not None:
+        result["records"] = records
+        result["records_per_sec"] = records / median if median > 0 else float('inf')
+    return result
+
+# Record counts timed by the execution time measurements unless other sizes are given
+MEASURED_SIZES = [100] + list(range(1000, 10001, 1000))
+
+def _measure_execution_times(records, run, run_with_tests, output_csv, repeats, warmup, sizes=None):
+    """Time run/run_with_tests on growing prefixes of records and write medians and IQRs to a CSV."""
+    results = []
+
+    for k in sizes or MEASURED_SIZES:
+        subset = records[:k]
+        no_tests = timing_statistics(time_repeated(lambda: run(subset), repeats, warmup), len(subset))
+        with_tests = timing_statistics(time_repeated(lambda: run_with_tests(subset), repeats, warmup), len(subset))
+        results.append([k, no_tests['median'], with_tests['median'], no_tests['iqr'], with_tests['iqr'],
+                        no_tests['records_per_sec']])
+        print(f"Processed {k} records: {no_tests['median']:.4f}s ± {no_tests['iqr']:.4f} (no tests), "
+              f"{with_tests['median']:.4f}s ± {with_tests['iqr']:.4f} (with tests)")
     # Write results to CSV
     with open(output_csv, 'w', newline='') as file:
         writer = csv.writer(file)
-        writer.writerow(["Lines_Read", "Exec_Time_No_Tests", "Exec_Time_With_Tests"])
+        writer.writerow(["Lines_Read", "Exec_Time_No_Tests", "Exec_Time_With_Tests",
+                         "IQR_No_Tests", "IQR_With_Tests", "Records_Per_Sec"])
         writer.writerows(results)
 
     print(f"Execution times have been saved to {output_csv}")
 
-def measure_execution_times_validate_mrz(input_file, output_csv):
-    """Measure execution times for validating records and write results to a CSV."""
-    results = []
+def measure_execution_times_encode_mrz(input_file, output_csv, workers=1, repeats=5, warmup=1, sizes=None):
+    """Measure median execution times for encoding records and write results to a CSV.
 
-    # Process for record counts: 100, 1000, ..., 10000
-    for k in [100] + list(range(1000, 10001, 1000)):
-        # Measure time without tests
-        records = read_user_data(input_file)['records_encoded'][:k]
-        start_no_tests = time.perf_counter()
-        for record in records:
-            parts = record.split(';')
-            line1 = parts[0]
-            line2 = parts[1]
-            is_valid = validate_mrz(line1, line2)
-        end_no_tests = time.perf_counter()
-
-        # Measure time with tests
-        start_with_tests = time.perf_counter()
-        for record in records:
-            parts = record.split(';')
-            line1 = parts[0]
-            line2 = parts[1]
-            is_valid = validate_mrz(line1, line2)
+    The input, a JSON file path or any iterable of decoded records such as
+    mrz_generator.generate_decoded_records, is read once up front; each record count is
+    timed `repeats` times after `warmup` untimed runs. With workers > 1 a single process
+    pool is started before timing and shared by every run.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    records = read_user_data(input_file)['records_decoded'] if isinstance(input_file, str) else list(input_file)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def encode(subset):
+        if executor is None:
+            return [encode_mrz(record) for record in subset]
+        return encode_mrz_batch(subset, workers=workers, executor=executor)
+
+    def encode_with_tests(subset):
+        for encoded_record in encode(subset):
+            assert encoded_record is not None
+            assert isinstance(encoded_record, str)
+
+    try:
+        _measure_execution_times(records, encode, encode_with_tests, output_csv, repeats, warmup, sizes)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def measure_execution_times_validate_mrz(input_file, output_csv, workers=1, repeats=5, warmup=1, sizes=None):
+    """Measure median execution times for validating records and write results to a CSV.
+
+    The input, a record file path or any iterable of encoded records such as
+    mrz_generator.generate_encoded_records, is read once up front; each record count is
+    timed `repeats` times after `warmup` untimed runs. With workers > 1 a single process
+    pool is started before timing and shared by every run.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    records = list(iter_encoded_records(input_file)) if isinstance(input_file, str) else list(input_file)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def validate(subset):
+        if executor is None:
+            return _validate_chunk(subset)
+        return validate_mrz_batch(subset, workers=workers, executor=executor)
+
+    def validate_with_tests(subset):
+        for is_valid in validate(subset):
             assert is_valid is not None
             assert isinstance(is_valid, bool)
-        end_with_tests = time.perf_counter()
 
-        # Calculate execution times
-        exec_time_no_tests = end_no_tests - start_no_tests
-        exec_time_with_tests = end_with_tests - start_with_tests
+    try:
+        _measure_execution_times(records, validate, validate_with_tests, output_csv, repeats, warmup, sizes)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-        # Append results
-        results.append([k, exec_time_no_tests, exec_time_with_tests])
-        print(f"Processed {k} records: {exec_time_no_tests:.4f}s (no tests), {exec_time_with_tests:.4f}s (with tests)")
-    # Write results to CSV
-    with open(output_csv, 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Lines_Read", "Exec_Time_No_Tests", "Exec_Time_With_Tests"])
-        writer.writerows(results)
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import MRTD
+imported = time.perf_counter()
+MRTD.validate_mrz(sys.argv[1], sys.argv[2], check_codes=True)
+validated = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_validation": validated - imported}))
+"""
 
-    print(f"Execution times have been saved to {output_csv}")
+def measure_startup_time(runs: int = 10, cwd: str = None):
+    """Measure cold `import MRTD` time and first-validation latency in fresh interpreters.
+
+    Returns the median of each over `runs` subprocesses, in seconds. Running from a
+    different `cwd` checks that startup no longer depends on the working directory.
+    """
+    import subprocess
+    line1 = "P<UTODOE<<JOHN<A<<<<<<<<<<<<<<<<<<<<<<<<<<<<"
+    line2 = "1234567892UTO8501012M30010171234567890<<<<5"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [MODULE_DIR, os.environ.get('PYTHONPATH')])))
+    imports = []
+    first_validations = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE, line1, line2], cwd=cwd or MODULE_DIR,
+                                env=env, capture_output=True, text=True, check=True).stdout
+        timings = json.loads(output)
+        imports.append(timings['import'])
+        first_validations.append(timings['first_validation'])
+    imports.sort()
+    first_validations.sort()
+    result = {"import": imports[runs // 2], "first_validation": first_validations[runs // 2]}
+    print(f"Cold import: {result['import'] * 1000:.2f} ms, first validation: {result['first_validation'] * 1000:.2f} ms")
+    return result
+
+def measure_check_digit_cache_speedup(input_file='records_encoded.json', capacity: int = 65536,
+                                      prewarm: bool = False, all_fields: bool = False, repeats: int = 10,
+                                      warmup: int = 1):
+    """Compare validating every record of input_file with and without the check-digit cache.
+
+    The two paths alternate run by run, so neither benefits from running second. Returns
+    timing_statistics of each path, the speedup of the medians and the cache counters.
+    """
+    records = [record.split(';') for record in read_user_data(input_file)['records_encoded']]
+
+    def validate_all():
+        for line1, line2 in records:
+            validate_mrz(line1, line2)
+
+    previous_cache = _check_digit_cache
+    previous_all_fields = _field_check_digit is not calculate_crc32_check_digit
+    cache = CheckDigitCache(capacity)
+    if prewarm:
+        cache.prewarm_dates()
+    uncached = []
+    cached = []
+    try:
+        for run in range(warmup + repeats):
+            for use_cache in ((False, True) if run % 2 else (True, False)):
+                if use_cache:
+                    enable_check_digit_cache(all_fields=all_fields, cache=cache)
+                else:
+                    disable_check_digit_cache()
+                timings = time_repeated(validate_all, 1, 0)
+                if run >= warmup:
+                    (cached if use_cache else uncached).extend(timings)
+    finally:
+        if previous_cache is None:
+            disable_check_digit_cache()
+        else:
+            enable_check_digit_cache(all_fields=previous_all_fields, cache=previous_cache)
+    uncached = timing_statistics(uncached, len(records))
+    cached = timing_statistics(cached, len(records))
+    result = {"uncached": uncached, "cached": cached, "speedup": uncached['median'] / cached['median'],
+              "cache": cache.stats()}
+    print(f"Uncached: {uncached['median']:.4f}s ± {uncached['iqr']:.4f}, "
+          f"cached: {cached['median']:.4f}s ± {cached['iqr']:.4f}, speedup: {result['speedup']:.2f}x")
+    return result
+
+def measure_check_digit_algorithms(input_file='records_encoded.json', algorithms=None, repeats: int = 10,
+                                   warmup: int = 2):
+    """Time every registered check-digit algorithm on the four checked fields of each record in input_file.
+
+    The scalar path calls the per-field function on every field; the batch path runs
+    the NumPy column function over each field column (skipped without NumPy or a batch
+    implementation). Returns {algorithm: {"scalar": stats, "batch": stats}} with
+    timing_statistics per path.
+    """
+    np = _get_numpy()
+    line2_rows = [record.split(';')[1] for record in read_user_data(input_file)['records_encoded']]
+    line2_rows = [line2 for line2 in line2_rows if len(line2) == LINE2_WIDTH]
+    fields = [line2[start:end] for line2 in line2_rows for start, end, _ in LINE2_CHECKED_FIELDS]
+    columns = [[line2[start:end] for line2 in line2_rows] for start, end, _ in LINE2_CHECKED_FIELDS]
+    results = {}
+    for name in algorithms or CHECK_DIGIT_ALGORITHMS:
+        algorithm = get_check_digit_algorithm(name)
+        check_digit = algorithm.check_digit
+        results[name] = {"scalar": timing_statistics(
+            time_repeated(lambda: [check_digit(field) for field in fields], repeats, warmup), len(line2_rows))}
+        if np is not None and algorithm.check_digits is not None:
+            check_digits = algorithm.check_digits
+            results[name]["batch"] = timing_statistics(
+                time_repeated(lambda: [check_digits(column) for column in columns], repeats, warmup), len(line2_rows))
+        for path, stats in results[name].items():
+            print(f"{name:>8} {path:>6}: median {stats['median'] * 1000:8.3f} ms, "
+                  f"{stats['records_per_sec']:12.0f} records/s")
+    return results
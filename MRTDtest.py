@@ -1,5 +1,33 @@
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from MRTD import encode_mrz, validate_mrz, read_user_data, validate_mrz_from_json
+from MRTD import iter_json_array, iter_encoded_records, iter_validate_mrz, summarize_mrz_validation
+from MRTD import encode_mrz_batch, validate_mrz_batch, iter_chunks
+from MRTD import calculate_crc32_check_digit, calculate_crc32_check_digits, validate_mrz_vectorized, np
+from MRTD import convert_to_fixed_width, validate_mrz_fixed_width, FIXED_RECORD_SIZE, MRZBatch
+from mrz_service import MicroBatcher, MRZValidationServer, percentile
+from MRTD import CountryCodeIndex, COUNTRY_CODE_INDEX, VALID_CODES, validate_code
+import MRTD
+import mrz_benchmark
+import mrz_distributed
+import mrz_generator
+
+def crash_once_then_validate(marker_path, *args):
+    """Shard function that kills its worker process the first time it runs."""
+    if not os.path.exists(marker_path):
+        open(marker_path, 'w').close()
+        os._exit(1)
+    return mrz_distributed.validate_shard(*args)
+
+def fail_shard(*args):
+    """Shard function with a bug: raises an error that is not worth retrying."""
+    raise ZeroDivisionError("bug in shard function")
 
 class TestMRTD(unittest.TestCase):
 
@@ -174,3 +202,1016 @@ class TestMRTD(unittest.TestCase):
         line2 = "L898902C30GBN7408123F1204153ZE18422<<7" 
         self.assertFalse(validate_mrz(line1, line2))
 
+
+class TestStreamingValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('sample_records_encoded.json')['records_encoded'][:50]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_iter_json_array_small_chunks(self):
+        """Items split across read chunks are still decoded correctly."""
+        content = '{"other": [1, 2], "records_encoded": [ "a;b" , "c;d","e;f"]}'
+        items = list(iter_json_array(io.StringIO(content), 'records_encoded', chunk_size=3))
+        self.assertEqual(items, ["a;b", "c;d", "e;f"])
+
+    def test_iter_json_array_missing_key(self):
+        """A missing key raises ValueError."""
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"records_decoded": []}'), 'records_encoded'))
+
+    def test_iter_encoded_records_formats_agree(self):
+        """JSON, JSON Lines and plain text files yield the same records."""
+        import json
+        json_path = self.write_file('records.json', json.dumps({'records_encoded': self.records}, indent=4))
+        jsonl_path = self.write_file('records.jsonl', ''.join(json.dumps(r) + '\n' for r in self.records))
+        text_path = self.write_file('records.txt', '\n'.join(self.records) + '\n')
+        for path in (json_path, jsonl_path, text_path):
+            self.assertEqual(list(iter_encoded_records(path)), self.records)
+
+    def test_iter_validate_mrz_matches_validate_mrz_from_json(self):
+        """The lazy validator yields the same results as validate_mrz_from_json."""
+        self.assertEqual(list(iter_validate_mrz('sample_records_encoded.json')),
+                         validate_mrz_from_json('sample_records_encoded.json'))
+
+    def test_summarize_mrz_validation(self):
+        """The summary counts valid and invalid records and keeps only the invalid ones."""
+        bad = self.records[0][:-1] + str((int(self.records[0][-1]) + 1) % 10)
+        path = self.write_file('records.txt', '\n'.join(self.records + [bad]))
+        summary = summarize_mrz_validation(path)
+        expected_valid = sum(validate_mrz(*r.split(';')) for r in self.records)
+        self.assertEqual(summary['valid'], expected_valid)
+        self.assertEqual(summary['invalid'], len(self.records) + 1 - expected_valid)
+        self.assertIn(bad.split(';')[1], [r['line2'] for r in summary['invalid_records']])
+        self.assertTrue(all(not r['is_valid'] for r in summary['invalid_records']))
+
+
+class TestBatchProcessing(unittest.TestCase):
+
+    def setUp(self):
+        self.encoded = read_user_data('records_encoded.json')['records_encoded'][:200]
+        self.decoded = [{
+            "line1": {"issuing_country": "UTO", "last_name": "DOE", "given_name": f"JOHN {i}"},
+            "line2": {"passport_number": f"{i:09d}", "country_code": "UTO", "birth_date": "850101",
+                      "sex": "M", "expiration_date": "300101", "personal_number": f"X{i:08d}"}
+        } for i in range(50)]
+
+    def test_iter_chunks(self):
+        """Chunks have at most chunk_size items and cover the input in order."""
+        self.assertEqual(list(iter_chunks(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_encode_mrz_batch_matches_serial(self):
+        """Parallel encoding keeps input order and matches encode_mrz."""
+        expected = [encode_mrz(record) for record in self.decoded]
+        self.assertEqual(encode_mrz_batch(self.decoded, workers=2, chunk_size=7), expected)
+        self.assertEqual(encode_mrz_batch(self.decoded, workers=1), expected)
+
+    def test_validate_mrz_batch_matches_serial(self):
+        """Parallel validation keeps input order and matches validate_mrz."""
+        records = self.encoded + ["P<UTODOE<<JOHN<A<<<<<<<<<<<<<<<<<<<<<<<<<<<<;123456789"]
+        expected = [validate_mrz(*record.split(';')) for record in records]
+        self.assertEqual(validate_mrz_batch(records, workers=2, chunk_size=13), expected)
+
+    def test_summarize_mrz_validation_parallel(self):
+        """The parallel summary matches the single-process summary."""
+        self.assertEqual(summarize_mrz_validation('sample_records_encoded.json', workers=2, chunk_size=500),
+                         summarize_mrz_validation('sample_records_encoded.json'))
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestVectorizedCheckDigits(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:500]
+
+    def test_check_digits_match_zlib(self):
+        """The NumPy engine matches zlib.crc32 % 10 for every field width used in the MRZ."""
+        for width in (6, 9, 14):
+            fields = [record.split(';')[1][:width] for record in self.records]
+            expected = [calculate_crc32_check_digit(field) for field in fields]
+            self.assertEqual(calculate_crc32_check_digits(fields).tolist(), expected)
+
+    def test_check_digits_from_buffer(self):
+        """A contiguous bytes buffer with an explicit width gives the same digits."""
+        fields = ["850101", "300101", "991231"]
+        digits = calculate_crc32_check_digits(''.join(fields).encode(), width=6)
+        self.assertEqual(digits.tolist(), [calculate_crc32_check_digit(f) for f in fields])
+
+    def test_check_digits_reject_mixed_widths(self):
+        """Fields of different widths raise instead of being silently re-split."""
+        with self.assertRaises(ValueError):
+            calculate_crc32_check_digits(["850101", "3001", "99123100"])
+        with self.assertRaises(ValueError):
+            calculate_crc32_check_digits(["850101", "300101"], width=9)
+        with self.assertRaises(ValueError):
+            calculate_crc32_check_digits(b"8501013001", width=6)
+
+    def test_validate_mrz_vectorized_matches_validate_mrz(self):
+        """Vectorized validation agrees with validate_mrz, including fallback records."""
+        corrupted = [record[:-1] + str((int(record[-1]) + 1) % 10) for record in self.records[:20]]
+        records = self.records + corrupted + ["P<UTODOE<<JOHN<A<<<<<<<<<<<<<<<<<<<<<<<<<<<<;123456789"]
+        expected = [validate_mrz(*record.split(';')) for record in records]
+        self.assertEqual(validate_mrz_vectorized(records).tolist(), expected)
+        self.assertEqual(validate_mrz_batch(records, workers=1, chunk_size=64, vectorized=True), expected)
+
+    def test_validate_mrz_vectorized_non_digit_check_character(self):
+        """A non-digit check character makes the record invalid instead of raising."""
+        record = self.records[0][:-1] + '<'
+        self.assertEqual(validate_mrz_vectorized([record]).tolist(), [False])
+        # Records outside the fixed layout go through the fallback, which must not raise either
+        self.assertEqual(validate_mrz_vectorized(['<' + record, 'no separator']).tolist(), [False, False])
+
+
+class TestFixedWidthValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:100]
+        self.records[5] = self.records[5][:-1] + str((int(self.records[5][-1]) + 1) % 10)
+        self.records.append("P<UTODOE<<JOHN<A<<<<<<<<<<<<<<<<<<<<<<<<<<<<;123456789")
+        self.input_path = os.path.join(self.tmpdir.name, 'records.txt')
+        self.output_path = os.path.join(self.tmpdir.name, 'records.mrz')
+        with open(self.input_path, 'w') as file:
+            file.write('\n'.join(self.records))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_convert_to_fixed_width(self):
+        """Converted files hold one fixed-size line per record and report records that do not fit."""
+        result = convert_to_fixed_width(self.input_path, self.output_path)
+        self.assertEqual(result['written'], 100)
+        self.assertEqual(result['skipped'], [self.records[-1]])
+        self.assertEqual(os.path.getsize(self.output_path), 100 * FIXED_RECORD_SIZE)
+        self.assertEqual(list(iter_encoded_records(self.output_path, 'text')), self.records[:100])
+
+    def test_validate_mrz_fixed_width(self):
+        """Memory-mapped validation matches the streaming summary for the same records."""
+        convert_to_fixed_width(self.input_path, self.output_path)
+        expected = summarize_mrz_validation(self.output_path, 'text')
+        self.assertEqual(expected['invalid'], 1)
+        self.assertEqual(validate_mrz_fixed_width(self.output_path), expected)
+        if np is not None:
+            self.assertEqual(validate_mrz_fixed_width(self.output_path, vectorized=True), expected)
+
+    def test_validate_mrz_fixed_width_empty_and_malformed(self):
+        """Empty files validate to zero counts and files of the wrong size are rejected."""
+        open(self.output_path, 'wb').close()
+        self.assertEqual(validate_mrz_fixed_width(self.output_path)['valid'], 0)
+        with open(self.output_path, 'wb') as file:
+            file.write(b'P<UTO')
+        with self.assertRaises(ValueError):
+            validate_mrz_fixed_width(self.output_path)
+
+    def test_validate_mrz_fixed_width_checks_framing(self):
+        """A file of the right size with CRLF line ends is rejected instead of being read out of step."""
+        with open(self.output_path, 'wb') as file:
+            # 89 records of 90 bytes fill exactly 90 records of 89 bytes
+            file.write(''.join(record + '\r\n' for record in self.records[:89]).encode())
+        with self.assertRaises(ValueError):
+            validate_mrz_fixed_width(self.output_path)
+
+    def test_validate_mrz_fixed_width_non_ascii_invalid_record(self):
+        """A non-ASCII byte in an invalid record is reported with a replacement character."""
+        convert_to_fixed_width(self.input_path, self.output_path)
+        with open(self.output_path, 'r+b') as file:
+            file.seek(5 * FIXED_RECORD_SIZE + 10)
+            file.write(b'\xc3')
+        for vectorized in (False, True) if np is not None else (False,):
+            summary = validate_mrz_fixed_width(self.output_path, vectorized=vectorized)
+            self.assertEqual(summary['invalid'], 1)
+            self.assertEqual(summary['invalid_records'][0]['line1'][10], '\ufffd')
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestMRZBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:300]
+        self.records[7] = self.records[7][:-1] + str((int(self.records[7][-1]) + 1) % 10)
+        self.batch = MRZBatch.from_records(self.records + ["P<UTO;123"])
+
+    def test_from_records(self):
+        """Records fitting the layout become columns; the rest are reported as skipped."""
+        self.assertEqual(len(self.batch), 300)
+        self.assertEqual(self.batch.skipped, ["P<UTO;123"])
+        line2 = self.records[0].split(';')[1]
+        self.assertEqual(self.batch.field('passport_number', 0), line2[0:9])
+        self.assertEqual(self.batch.field('birth_date', 0), line2[13:19])
+        self.assertLessEqual(self.batch.nbytes / len(self.batch), 88)
+
+    def test_validate_and_invalid(self):
+        """Bulk validation agrees with validate_mrz and invalid() keeps only failures."""
+        expected = [validate_mrz(*record.split(';')) for record in self.records]
+        self.assertEqual(self.batch.validate().tolist(), expected)
+        self.assertEqual(list(self.batch.invalid().iter_records()), [self.records[7]])
+
+    def test_by_country(self):
+        """Filtering by country selects exactly the matching records."""
+        country = self.records[0].split(';')[1][10:13]
+        expected = [record for record in self.records if record.split(';')[1][10:13] == country]
+        self.assertEqual(list(self.batch.by_country(country).iter_records()), expected)
+        self.assertEqual(len(self.batch.by_country('ZZZ')), 0)
+
+    def test_export_round_trip(self):
+        """Exported records match the input and the fixed-width export reloads identically."""
+        self.assertEqual(list(self.batch.iter_records()), self.records)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'records.mrz')
+            self.batch.write_fixed_width(path)
+            self.assertEqual(list(MRZBatch.from_fixed_width(path).iter_records()), self.records)
+            self.assertEqual(validate_mrz_fixed_width(path)['invalid'], 1)
+
+
+class TestValidationService(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:20]
+
+    def test_percentile(self):
+        """Nearest-rank percentiles of sorted samples."""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 0.50), 50)
+        self.assertEqual(percentile(samples, 0.99), 99)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_micro_batcher_groups_concurrent_requests(self):
+        """Concurrent submissions are validated in batches no larger than max_batch_size."""
+        async def run():
+            batcher = MicroBatcher(max_batch_size=8, max_wait_ms=50)
+            batcher.start()
+            results = await asyncio.gather(*(batcher.submit(record) for record in self.records))
+            await batcher.stop()
+            return results, batcher.stats.snapshot()
+
+        results, stats = asyncio.run(run())
+        self.assertEqual(results, [validate_mrz(*record.split(';')) for record in self.records])
+        self.assertEqual(stats['requests'], 20)
+        self.assertEqual(stats['batches'], 3)
+
+    def test_server_round_trip(self):
+        """The TCP server answers pipelined requests in order and reports stats."""
+        bad = self.records[0][:-1] + str((int(self.records[0][-1]) + 1) % 10)
+        requests = [self.records[0], bad, "no separator", "STATS"]
+
+        async def run():
+            server = MRZValidationServer(port=0, max_wait_ms=5)
+            await server.start()
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            writer.write(''.join(request + '\n' for request in requests).encode())
+            await writer.drain()
+            responses = [(await reader.readline()).decode().strip() for _ in requests]
+            writer.close()
+            await writer.wait_closed()
+            await server.stop()
+            return responses
+
+        responses = asyncio.run(run())
+        self.assertEqual(responses[:3], ['VALID', 'INVALID', 'ERROR IndexError'])
+        self.assertIn('p99_latency_ms', responses[3])
+
+    def test_server_rejects_bad_lines(self):
+        """Non-UTF-8 and overlong lines are answered with ERROR and the connection keeps working."""
+        requests = [b'\xff\xfe' + self.records[0][2:].encode(), b'P' * 100000, self.records[0].encode()]
+
+        async def run():
+            server = MRZValidationServer(port=0, max_wait_ms=5)
+            await server.start()
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            writer.write(b''.join(request + b'\n' for request in requests))
+            await writer.drain()
+            responses = [(await reader.readline()).decode().strip() for _ in requests]
+            writer.close()
+            await writer.wait_closed()
+            await server.stop()
+            return responses
+
+        self.assertEqual(asyncio.run(run()), ['ERROR UnicodeDecodeError', 'ERROR LimitOverrunError', 'VALID'])
+
+
+class TestCountryCodeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:100]
+        # Line 1 issuing state and line 2 nationality replaced by a code from valid_codes.json
+        self.known = [record[:2] + 'UTO' + record[5:55] + 'UTO' + record[58:] for record in self.records[:10]]
+
+    def test_index_matches_valid_codes(self):
+        """Every code in valid_codes.json is found, padded or not, and nothing else is."""
+        for code in VALID_CODES:
+            self.assertIn(code, COUNTRY_CODE_INDEX)
+            self.assertIn(code.ljust(3, '<'), COUNTRY_CODE_INDEX)
+            self.assertTrue(validate_code(code))
+        self.assertEqual(len(COUNTRY_CODE_INDEX), len(VALID_CODES))
+        for code in ('ZZZ', 'GB', 'ut0', '', 'UTOO', b'ZZZ'):
+            self.assertNotIn(code, COUNTRY_CODE_INDEX)
+        self.assertIn(b'UTO', COUNTRY_CODE_INDEX)
+
+    def test_index_serialization_round_trip(self):
+        """The bitset survives to_bytes/from_bytes and save/load unchanged."""
+        index = CountryCodeIndex.from_codes(['D', 'GBR', 'UTO'])
+        self.assertEqual(CountryCodeIndex.from_bytes(index.to_bytes()).codes, {'D<<', 'GBR', 'UTO'})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'codes.bin')
+            index.save(path)
+            self.assertEqual(CountryCodeIndex.load(path).codes, index.codes)
+        with self.assertRaises(ValueError):
+            CountryCodeIndex.from_bytes(b'short')
+
+    def test_validate_mrz_check_codes(self):
+        """Country checks are opt-in and reject records with unknown issuing state or nationality."""
+        line1, line2 = self.records[0].split(';')
+        self.assertTrue(validate_mrz(line1, line2))
+        self.assertFalse(validate_mrz(line1, line2, check_codes=True))
+        self.assertTrue(validate_mrz(*self.known[0].split(';'), check_codes=True))
+        self.assertFalse(validate_mrz(line1[:2] + 'ZZZ' + line1[5:], self.known[0].split(';')[1], check_codes=True))
+
+    def test_batch_paths_check_codes(self):
+        """Batch, vectorized and columnar validation agree with validate_mrz when checking codes."""
+        records = self.records + self.known
+        expected = [validate_mrz(*record.split(';'), check_codes=True) for record in records]
+        self.assertEqual(sum(expected), 10)
+        self.assertEqual(validate_mrz_batch(records, workers=1, check_codes=True), expected)
+        if np is not None:
+            self.assertEqual(validate_mrz_vectorized(records, check_codes=True).tolist(), expected)
+            self.assertEqual(MRZBatch.from_records(records).validate(check_codes=True).tolist(), expected)
+            column = np.frombuffer(b'UTOZZZD<<KS<', dtype=np.uint8).reshape(4, 3)
+            self.assertEqual(COUNTRY_CODE_INDEX.mask(column).tolist(), [True, False, False, True])
+
+
+class TestLazyCodeTables(unittest.TestCase):
+
+    def tearDown(self):
+        os.environ.pop('MRTD_CODE_TABLES', None)
+        MRTD.reset_code_tables()
+
+    def test_import_does_not_load_code_tables(self):
+        """Importing MRTD from another working directory reads no code table until first use."""
+        import subprocess
+        import sys
+        script = ("import MRTD; assert MRTD._code_tables is None; "
+                  "assert MRTD.validate_code('UTO'); assert MRTD._code_tables is not None")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            subprocess.run([sys.executable, '-c', script], cwd=tmpdir, check=True,
+                           env=dict(os.environ, PYTHONPATH=MRTD.MODULE_DIR))
+
+    def test_prebuilt_code_tables(self):
+        """Prebuilt pickled tables are used when MRTD_CODE_TABLES points at them."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'tables.pickle')
+            MRTD.build_code_tables(path)
+            os.environ['MRTD_CODE_TABLES'] = path
+            MRTD.reset_code_tables()
+            self.assertEqual(MRTD.get_valid_codes(), MRTD.load_valid_codes())
+            self.assertEqual(MRTD.get_country_code_index().codes, COUNTRY_CODE_INDEX.codes)
+
+    def test_measure_startup_time(self):
+        """The startup benchmark reports positive import and first-validation times."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result = MRTD.measure_startup_time(runs=1, cwd=tmpdir)
+        self.assertGreater(result['import'], 0)
+        self.assertGreater(result['first_validation'], 0)
+
+    def test_import_stays_cheap(self):
+        """`import MRTD` stays within its time budget and leaves the optional-feature modules unloaded."""
+        self.assertLess(MRTD.measure_startup_time(runs=5)['import'], 0.05)
+        script = ("import sys, MRTD\n"
+                  "print(' '.join(name for name in ('multiprocessing', 'subprocess', 'sqlite3', 'hashlib', 'lzma',"
+                  " 'gzip', 'statistics', 'numpy') if name in sys.modules))\n")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(MRTD.__file__)))
+        self.assertEqual(output.stdout.strip(), '')
+
+
+class TestCheckDigitCache(unittest.TestCase):
+
+    def tearDown(self):
+        MRTD.disable_check_digit_cache()
+
+    def test_counters_and_eviction(self):
+        """Hits, misses and evictions are counted and capacity bounds the size."""
+        cache = MRTD.CheckDigitCache(capacity=2)
+        for field in ('850101', '850101', '300101', '991231', '850101'):
+            self.assertEqual(cache.get(field), calculate_crc32_check_digit(field))
+        self.assertEqual(cache.stats(), {"capacity": 2, "size": 2, "hits": 1, "misses": 4, "evictions": 2})
+        with self.assertRaises(ValueError):
+            MRTD.CheckDigitCache(capacity=0)
+
+    def test_prewarm_dates(self):
+        """Prewarming caches every calendar YYMMDD value without counting misses."""
+        cache = MRTD.CheckDigitCache(capacity=None)
+        cache.prewarm_dates()
+        self.assertEqual(cache.stats()['size'], 36525)
+        self.assertEqual(cache.stats()['misses'], 0)
+        cache.get('000229')
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_prewarm_twice_counts_only_real_lookups(self):
+        """Prewarming again, or after real lookups, neither hides those lookups nor adds to the counters."""
+        cache = MRTD.CheckDigitCache(capacity=None)
+        cache.get('850101')
+        cache.prewarm_dates()
+        cache.prewarm_dates()
+        self.assertEqual(cache.stats(), {"capacity": None, "size": 36525, "hits": 0, "misses": 1, "evictions": 0})
+
+    def test_cached_validation_matches_uncached(self):
+        """encode_mrz and validate_mrz give the same results with the cache enabled."""
+        records = read_user_data('records_encoded.json')['records_encoded'][:500]
+        expected = [validate_mrz(*record.split(';')) for record in records]
+        cache = MRTD.enable_check_digit_cache(capacity=128, all_fields=True)
+        self.assertEqual([validate_mrz(*record.split(';')) for record in records], expected)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 4 * len(records))
+        self.assertGreater(stats['evictions'], 0)
+
+    def test_thread_safety(self):
+        """Concurrent lookups from many threads all return correct digits."""
+        from concurrent.futures import ThreadPoolExecutor
+        cache = MRTD.CheckDigitCache(capacity=64)
+        fields = [f"{i % 200:06d}" for i in range(5000)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(cache.get, fields))
+        self.assertEqual(results, [calculate_crc32_check_digit(field) for field in fields])
+        self.assertEqual(cache.stats()['hits'] + cache.stats()['misses'], 5000)
+
+    def test_measure_check_digit_cache_speedup(self):
+        """The cache benchmark restores the previous cache state and reports counters."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = MRTD.measure_check_digit_cache_speedup('records_encoded.json', repeats=2, warmup=0)
+        self.assertGreater(result['speedup'], 0)
+        self.assertEqual((result['cached']['runs'], result['uncached']['runs']), (2, 2))
+        self.assertGreater(result['cache']['hits'], 0)
+        self.assertIsNone(MRTD._check_digit_cache)
+        previous = MRTD.enable_check_digit_cache(capacity=16, all_fields=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            MRTD.measure_check_digit_cache_speedup('records_encoded.json', repeats=1, warmup=0)
+        self.assertIs(MRTD._check_digit_cache, previous)
+        self.assertIs(MRTD._field_check_digit, previous.lookup)
+
+    def test_detailed_validation_uses_the_date_cache(self):
+        """validate_mrz_detailed looks the two dates up in the cache and gives the same codes."""
+        records = read_user_data('records_encoded.json')['records_encoded'][:100]
+        expected = [MRTD.validate_mrz_record_detailed(record) for record in records]
+        cache = MRTD.enable_check_digit_cache()
+        self.assertEqual([MRTD.validate_mrz_record_detailed(record) for record in records], expected)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 2 * len(records))
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_time_repeated_runs_warmup_untimed(self):
+        """Warmup calls happen but only the repeated calls are timed."""
+        calls = []
+        timings = MRTD.time_repeated(lambda: calls.append(1), repeats=4, warmup=2)
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(len(timings), 4)
+
+    def test_timing_statistics(self):
+        """Median, quartiles, IQR and records/sec are computed from the timings."""
+        stats = MRTD.timing_statistics([4.0, 1.0, 3.0, 2.0, 5.0], records=10)
+        self.assertEqual((stats['median'], stats['q1'], stats['q3'], stats['iqr']), (3.0, 2.0, 4.0, 2.0))
+        self.assertAlmostEqual(stats['records_per_sec'], 10 / 3.0)
+        self.assertEqual(MRTD.timing_statistics([2.0])['iqr'], 0)
+
+    def test_decode_mrz_round_trip(self):
+        """encode_mrz(decode_mrz(...)) reproduces the original encoded records."""
+        for record in read_user_data('records_encoded.json')['records_encoded'][:200]:
+            self.assertEqual(encode_mrz(MRTD.decode_mrz(*record.split(';'))), record)
+
+    def test_run_and_compare_benchmarks(self):
+        """Benchmark results cover every stage and a clearly slower run is flagged as a regression."""
+        results = mrz_benchmark.run_benchmarks(sizes=(100,), repeats=2, warmup=1)
+        self.assertEqual([entry['stage'] for entry in results['results']], list(mrz_benchmark.STAGES))
+        self.assertEqual(mrz_benchmark.compare_results(results, results), [])
+        slower = {**results, "results": [dict(entry, median=entry['median'] * 2, q1=entry['q3'] * 2, q3=entry['q3'] * 3)
+                                         for entry in results['results']]}
+        regressions = mrz_benchmark.compare_results(results, slower)
+        self.assertEqual(len(regressions), len(results['results']))
+        self.assertAlmostEqual(regressions[0]['change'], 1.0)
+
+    def test_measure_execution_times_validate_mrz_csv(self):
+        """The validate benchmark writes medians, IQRs and throughput for each record count."""
+        import csv
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'times.csv')
+            MRTD.measure_execution_times_validate_mrz('records_encoded.json', path, repeats=1, warmup=0)
+            with open(path) as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual([int(row['Lines_Read']) for row in rows], [100] + list(range(1000, 10001, 1000)))
+        self.assertIn('IQR_No_Tests', rows[0])
+
+    def test_measure_with_workers_starts_one_pool(self):
+        """Parallel measurements reuse one process pool across every size and repeat."""
+        from concurrent.futures import ProcessPoolExecutor
+        from unittest import mock
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                mock.patch('concurrent.futures.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as pool, \
+                contextlib.redirect_stdout(io.StringIO()):
+            MRTD.measure_execution_times_validate_mrz('records_encoded.json', os.path.join(tmpdir, 'times.csv'),
+                                                      workers=2, repeats=2, warmup=1, sizes=[100, 200])
+        self.assertEqual(pool.call_count, 1)
+
+
+class TestStreamingEncoder(unittest.TestCase):
+
+    def setUp(self):
+        import json
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.encoded = read_user_data('records_encoded.json')['records_encoded'][:250]
+        self.decoded = [MRTD.decode_mrz(*record.split(';')) for record in self.encoded]
+        self.input_path = os.path.join(self.tmpdir.name, 'records_decoded.json')
+        with open(self.input_path, 'w') as file:
+            json.dump({'records_decoded': self.decoded}, file, indent=4)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_encode_mrz_stream_formats(self):
+        """Streaming encode output reads back identically as JSON, JSON Lines, gzip and lzma."""
+        for name in ('out.json', 'out.jsonl', 'out.json.gz', 'out.jsonl.xz', 'out.txt'):
+            output_path = os.path.join(self.tmpdir.name, name)
+            count = MRTD.encode_mrz_stream(self.input_path, output_path, chunk_size=64)
+            self.assertEqual(count, 250)
+            self.assertEqual(list(iter_encoded_records(output_path)), self.encoded, name)
+        self.assertEqual(read_user_data(os.path.join(self.tmpdir.name, 'out.json'))['records_encoded'], self.encoded)
+
+    def test_encode_mrz_stream_parallel(self):
+        """Parallel streaming encode keeps input order."""
+        output_path = os.path.join(self.tmpdir.name, 'out.jsonl')
+        MRTD.encode_mrz_stream(self.input_path, output_path, workers=2, chunk_size=32)
+        self.assertEqual(list(iter_encoded_records(output_path)), self.encoded)
+
+    def test_writer_empty_and_compression_override(self):
+        """An empty JSON output is still valid and compression can be chosen explicitly."""
+        path = os.path.join(self.tmpdir.name, 'empty.json')
+        with MRTD.EncodedRecordWriter(path):
+            pass
+        self.assertEqual(read_user_data(path), {'records_encoded': []})
+        path = os.path.join(self.tmpdir.name, 'records.data')
+        with MRTD.EncodedRecordWriter(path, file_format='jsonl', compression='gzip', buffer_records=7) as writer:
+            writer.write_many(self.encoded)
+        self.assertEqual(list(iter_encoded_records(path, 'jsonl', compression='gzip')), self.encoded)
+        with self.assertRaises(ValueError):
+            MRTD.EncodedRecordWriter(path, compression='zstd')
+
+    def test_failed_encode_keeps_previous_output(self):
+        """An error part way through leaves the existing output file as it was, with no footer or temp file."""
+        output_path = os.path.join(self.tmpdir.name, 'out.json')
+        MRTD.encode_mrz_stream(self.input_path, output_path, chunk_size=64)
+        with open(output_path) as file:
+            previous = file.read()
+        with self.assertRaises(RuntimeError):
+            with MRTD.EncodedRecordWriter(output_path, buffer_records=7) as writer:
+                writer.write_many(self.encoded[:20])
+                raise RuntimeError("encoding failed")
+        with open(output_path) as file:
+            self.assertEqual(file.read(), previous)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['out.json', 'records_decoded.json'])
+
+
+class TestMRZEncoder(unittest.TestCase):
+
+    def make_record(self, **fields):
+        record = {
+            "line1": {"issuing_country": "UTO", "last_name": "DOE", "given_name": "JOHN A"},
+            "line2": {"passport_number": "L898902C3", "country_code": "UTO", "birth_date": "850101",
+                      "sex": "M", "expiration_date": "300101", "personal_number": "ZE184226B"}
+        }
+        for key, value in fields.items():
+            line = 'line1' if key in record['line1'] else 'line2'
+            record[line][key] = value
+        return record
+
+    def test_byte_identical_to_encode_mrz(self):
+        """The fast path matches encode_mrz for real records and padding/truncation edge cases."""
+        encoder = MRTD.MRZEncoder()
+        records = [MRTD.decode_mrz(*record.split(';'))
+                   for record in read_user_data('records_encoded.json')['records_encoded'][:300]]
+        records += [
+            self.make_record(),
+            self.make_record(last_name="A" * 45),
+            self.make_record(last_name="VAN DER BERG", given_name="ANNA MARIA " * 5),
+            self.make_record(passport_number="", birth_date="", expiration_date="", personal_number=""),
+            self.make_record(passport_number="1234567890123", personal_number="1" * 20, country_code="D"),
+            self.make_record(passport_number="AB 123"),
+        ]
+        for record in records:
+            self.assertEqual(encoder.encode_bytes(record), encode_mrz(record).encode())
+            buffer = bytearray(b'#' * 100)
+            self.assertTrue(encoder.encode_into(record, buffer, 5))
+            self.assertEqual(bytes(buffer[5:93]), encode_mrz(record).encode())
+            self.assertEqual(bytes(buffer[:5] + buffer[93:]), b'#' * 12)
+
+    def test_fallback_records(self):
+        """Records outside the fixed ASCII layout are reported and still encoded via encode_mrz."""
+        encoder = MRTD.MRZEncoder()
+        for record in (self.make_record(issuing_country="D"), self.make_record(sex=""),
+                       self.make_record(last_name="MÜLLER"), self.make_record(given_name="A\0B")):
+            self.assertFalse(encoder.encode_into(record, bytearray(88)))
+            self.assertEqual(encoder.encode_bytes(record), encode_mrz(record).encode())
+
+    def test_encode_mrz_to_file(self):
+        """File output matches encode_mrz line by line across chunk boundaries and fallbacks."""
+        records = [self.make_record(passport_number=f"{i:09d}") for i in range(25)]
+        records.insert(10, self.make_record(issuing_country="D"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'records.txt')
+            result = MRTD.encode_mrz_to_file(records, path, chunk_records=4)
+            self.assertEqual(result, {"written": 26, "fallback": 1})
+            self.assertEqual(list(iter_encoded_records(path, 'text')), [encode_mrz(record) for record in records])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:100]
+
+    def tearDown(self):
+        MRTD.disable_instrumentation()
+
+    def test_disabled_by_default(self):
+        """No stats are collected unless instrumentation is enabled."""
+        self.assertIsNone(MRTD.get_instrumentation_stats())
+        with self.assertRaises(RuntimeError):
+            MRTD.dump_instrumentation_stats(os.devnull)
+
+    def test_results_unchanged_and_reasons_counted(self):
+        """Instrumented validation returns the same results and breaks failures down by reason."""
+        line1, line2 = self.records[0].split(';')
+        wrong_passport = line2[:9] + str((int(line2[9]) + 1) % 10) + line2[10:]
+        wrong_both = wrong_passport[:-1] + str((int(line2[-1]) + 1) % 10)
+        cases = [record.split(';') for record in self.records] + [
+            (line1, wrong_passport), (line1, wrong_both), (line1, line2[:-1] + '<'), (line1, '123')]
+        expected = []
+        for case in cases[:-2]:
+            expected.append(validate_mrz(*case))
+        stats = MRTD.enable_instrumentation()
+        self.assertEqual([validate_mrz(*case) for case in cases[:-2]], expected)
+        with self.assertRaises(ValueError):
+            validate_mrz(*cases[-2])
+        self.assertFalse(validate_mrz(*cases[-1]))
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['calls']['validate'], len(cases))
+        self.assertEqual(snapshot['results'], {"valid": 100, "invalid": 3, "error": 1})
+        self.assertEqual(snapshot['invalid_reasons'], {
+            "passport_check_digit": 2, "personal_number_check_digit": 2,
+            "non_digit_check_character": 1, "bad_length": 1})
+        self.assertEqual(snapshot['stages']['validate.length_check']['calls'], len(cases))
+        self.assertGreater(snapshot['stages']['validate.parse_line2']['seconds'], 0)
+
+    def test_instrumented_paths_match_plain_paths(self):
+        """The inline and the stage-by-stage implementations agree for every algorithm and code check."""
+        decoded = [MRTD.decode_mrz(*record.split(';')) for record in self.records]
+        cases = [record.split(';') for record in self.records]
+        cases[1] = (cases[1][0], cases[1][1][:-1] + str((int(cases[1][1][-1]) + 1) % 10))
+        cases[2] = ('P<XXXDOE<<JOHN' + '<' * 30, cases[2][1])
+        for algorithm in ('crc32', 'icao'):
+            for check_codes in (False, True):
+                plain = ([encode_mrz(record, algorithm) for record in decoded],
+                         [validate_mrz(line1, line2, check_codes, algorithm) for line1, line2 in cases])
+                MRTD.enable_instrumentation()
+                instrumented = ([encode_mrz(record, algorithm) for record in decoded],
+                                [validate_mrz(line1, line2, check_codes, algorithm) for line1, line2 in cases])
+                MRTD.disable_instrumentation()
+                self.assertEqual(instrumented, plain, (algorithm, check_codes))
+
+    def test_encode_instrumented_and_exports(self):
+        """Instrumented encoding is unchanged and stats export as JSON and Prometheus text."""
+        import json
+        decoded = [MRTD.decode_mrz(*record.split(';')) for record in self.records[:10]]
+        stats = MRTD.enable_instrumentation()
+        self.assertEqual([encode_mrz(record) for record in decoded], self.records[:10])
+        self.assertEqual(json.loads(stats.to_json())['calls'], {"encode": 10})
+        prometheus = stats.to_prometheus()
+        self.assertIn('mrtd_calls_total{operation="encode"} 10', prometheus)
+        self.assertIn('mrtd_stage_seconds_total{operation="encode",stage="check_digits"}', prometheus)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'stats.prom')
+            MRTD.dump_instrumentation_stats(path, 'prometheus')
+            with open(path) as file:
+                self.assertEqual(file.read(), prometheus)
+        self.assertIs(MRTD.disable_instrumentation(), stats)
+        self.assertIsNone(MRTD.get_instrumentation_stats())
+
+
+class TestFailureDiagnostics(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:100]
+
+    def test_detailed_matches_validate_mrz(self):
+        """MRZ_VALID agrees with validate_mrz and every failed check gets its own bit."""
+        for record in self.records:
+            line1, line2 = record.split(';')
+            self.assertEqual(MRTD.validate_mrz_detailed(line1, line2) == MRTD.MRZ_VALID, validate_mrz(line1, line2))
+        line1, line2 = self.records[0].split(';')
+        wrong_passport = line2[:9] + str((int(line2[9]) + 1) % 10) + line2[10:]
+        self.assertEqual(MRTD.validate_mrz_detailed(line1, wrong_passport[:-1] + '<'),
+                         MRTD.MRZ_PASSPORT_CHECK_DIGIT | MRTD.MRZ_PERSONAL_NUMBER_CHECK_DIGIT
+                         | MRTD.MRZ_NON_DIGIT_CHECK_CHARACTER)
+        self.assertEqual(MRTD.validate_mrz_detailed(line1, '123'), MRTD.MRZ_BAD_LENGTH)
+        self.assertTrue(MRTD.validate_mrz_detailed('P<GB' + line1[4:], line2, check_codes=True)
+                        & MRTD.MRZ_INVALID_ISSUING_STATE)
+        self.assertEqual(MRTD.validate_mrz_record_detailed('no separator'), MRTD.MRZ_BAD_FORMAT)
+        self.assertEqual(MRTD.describe_mrz_failures(MRTD.MRZ_BAD_LENGTH | MRTD.MRZ_BIRTH_CHECK_DIGIT),
+                         ['bad_length', 'birth_check_digit'])
+
+    def test_batch_histogram(self):
+        """Batch result codes keep input order and aggregate into a failure histogram."""
+        broken = self.records[1][:-1] + '<'
+        records = self.records + [broken, 'no separator']
+        codes = MRTD.validate_mrz_batch_detailed(records, workers=1, chunk_size=7)
+        self.assertEqual(codes, [MRTD.validate_mrz_record_detailed(record) for record in records])
+        self.assertEqual(MRTD.failure_histogram(codes), {
+            "valid": 100, "personal_number_check_digit": 1, "non_digit_check_character": 1, "bad_format": 1})
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_mrz_batch_validate_detailed(self):
+        """Columnar result codes match the per-record ones."""
+        records = self.records + [self.records[2][:-1] + '<', self.records[3][:-1] + '0']
+        batch = MRZBatch.from_records(records)
+        expected = [MRTD.validate_mrz_record_detailed(record, check_codes=True) for record in records]
+        self.assertEqual(batch.validate_detailed(check_codes=True).tolist(), expected)
+
+
+class TestValidationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmpdir.name, 'index.sqlite3')
+        records = read_user_data('records_encoded.json')['records_encoded'][:200]
+        # The duplicates and the malformed record share the last 64-record chunk with their originals
+        self.records = records + records[195:200] + [records[0][:-1] + '<']
+        self.input_path = os.path.join(self.tmpdir.name, 'records.jsonl')
+        self.write_records(self.records)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_records(self, records):
+        with open(self.input_path, 'w') as file:
+            file.writelines(f'"{record}"\n' for record in records)
+
+    def test_rerun_reuses_results_and_drops_duplicates(self):
+        """A second run validates nothing, and duplicates within a chunk are counted once."""
+        first = MRTD.summarize_mrz_validation_incremental(self.input_path, self.index_path, chunk_size=64)
+        self.assertEqual((first['valid'], first['invalid'], first['duplicates'], first['cached']), (200, 1, 5, 0))
+        self.assertEqual(first['invalid_records'][0]['line2'], self.records[-1].split(';')[1])
+        second = MRTD.summarize_mrz_validation_incremental(self.input_path, self.index_path, chunk_size=64)
+        self.assertEqual(second, dict(first, cached=len(self.records)))
+
+    def test_changed_record_revalidates_only_its_chunk(self):
+        """Changing one record misses the index for its chunk alone."""
+        MRTD.summarize_mrz_validation_incremental(self.input_path, self.index_path, chunk_size=64)
+        changed = list(self.records)
+        changed[70] = changed[70][:-1] + str((int(changed[70][-1]) + 1) % 10)
+        self.write_records(changed)
+        summary = MRTD.summarize_mrz_validation_incremental(self.input_path, self.index_path, chunk_size=64)
+        self.assertEqual(summary['cached'], len(changed) - 64)
+        self.assertEqual((summary['valid'], summary['invalid']), (199, 2))
+
+    def test_version_change_invalidates(self):
+        """Opening the index under another version stamp drops the stored results."""
+        MRTD.summarize_mrz_validation_incremental(self.input_path, self.index_path, chunk_size=64)
+        with MRTD.ValidationIndex(self.index_path) as index:
+            self.assertEqual(len(index), 4)
+            key = MRTD.ValidationIndex.chunk_key(self.records[192:])
+            self.assertEqual(index.get(key), (8, 5, [self.records[-1]]))
+        with MRTD.ValidationIndex(self.index_path, MRTD.validation_version(check_codes=True)) as index:
+            self.assertEqual(len(index), 0)
+
+
+class TestShardedValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        records = read_user_data('records_encoded.json')['records_encoded'][:300]
+        records[7] = records[7][:-1] + str((int(records[7][-1]) + 1) % 10)
+        self.records = records
+        self.json_path = os.path.join(self.tmpdir.name, 'records.json')
+        with MRTD.EncodedRecordWriter(self.json_path) as writer:
+            writer.write_many(records)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shards_are_line_aligned_and_cover_the_file(self):
+        """Shards tile the file and together hold every record once, in order."""
+        shards = mrz_distributed.plan_shards(self.json_path, 7)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], os.path.getsize(self.json_path))
+        self.assertTrue(all(end == next_start for (_, end), (next_start, _) in zip(shards, shards[1:])))
+        records = [record for start, end in shards
+                   for record in mrz_distributed.iter_shard_records(self.json_path, start, end, 'json')]
+        self.assertEqual(records, self.records)
+
+    def test_summary_matches_streaming_summary(self):
+        """The merged summary equals the one summarize_mrz_validation produces."""
+        summary = mrz_distributed.run_sharded_validation(self.json_path, workers=2, shards=5)
+        self.assertEqual((summary['shards'], summary['retries']), (5, 0))
+        del summary['shards'], summary['retries']
+        self.assertEqual(summary, summarize_mrz_validation(self.json_path))
+
+    def test_crashed_worker_is_retried(self):
+        """A worker dying mid-shard breaks the pool, which is recreated and the shards rerun."""
+        from functools import partial
+        crash = partial(crash_once_then_validate, os.path.join(self.tmpdir.name, 'crashed'))
+        summary = mrz_distributed.run_sharded_validation(self.json_path, workers=2, shards=3, shard_function=crash)
+        self.assertGreater(summary['retries'], 0)
+        self.assertEqual((summary['valid'], summary['invalid']), (299, 1))
+
+    def test_malformed_record_does_not_fail_its_shard(self):
+        """A non-digit check character or a missing separator only makes its own record invalid."""
+        records = list(self.records)
+        records[3] = records[3][:-1] + '<'
+        records[4] = records[4].replace(';', '')
+        with MRTD.EncodedRecordWriter(self.json_path) as writer:
+            writer.write_many(records)
+        summary = mrz_distributed.validate_shard(self.json_path, 0, os.path.getsize(self.json_path), 'json')
+        self.assertEqual((summary['valid'], summary['invalid']), (297, 3))
+        self.assertEqual(summary['invalid_records'][1]['line2'], '')
+
+    def test_shard_bug_is_not_retried(self):
+        """Exceptions other than OSError and a broken pool propagate without retries."""
+        with self.assertRaises(ZeroDivisionError):
+            mrz_distributed.run_sharded_validation(self.json_path, workers=1, shards=2, shard_function=fail_shard)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestSyntheticGenerator(unittest.TestCase):
+
+    def test_generated_records_are_valid_and_round_trip(self):
+        """Clean records pass validation with country codes and match encode_mrz of their decoded form."""
+        records = list(mrz_generator.generate_encoded_records(500, seed=7))
+        self.assertEqual(len(records), 500)
+        self.assertTrue(all(validate_mrz(*record.split(';'), check_codes=True) for record in records))
+        decoded = list(mrz_generator.generate_decoded_records(500, seed=7))
+        self.assertEqual([encode_mrz(record) for record in decoded], records)
+
+    def test_seeded_output_is_reproducible_across_workers_and_formats(self):
+        """The same seed gives the same records for any worker count and output format."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, name) for name in ('a.txt', 'b.txt', 'c.json', 'd.jsonl')]
+            for path, workers in zip(paths, (1, 2, 1, 1)):
+                mrz_generator.generate_encoded_file(path, 2500, seed=3, corrupt_fraction=0.1,
+                                                    bad_length_fraction=0.05, workers=workers, chunk_records=1000)
+            with open(paths[0], 'rb') as first, open(paths[1], 'rb') as second:
+                self.assertEqual(first.read(), second.read())
+            records = [list(iter_encoded_records(path)) for path in paths]
+            self.assertEqual(records[0], records[2])
+            self.assertEqual(records[0], records[3])
+            self.assertEqual(len(read_user_data(paths[2])['records_encoded']), 2500)
+            self.assertNotEqual(records[0], list(mrz_generator.generate_encoded_records(2500, seed=4, chunk_records=1000)))
+
+    def test_fault_fractions(self):
+        """Corrupted check digits and short lines appear in the requested proportions."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'records.txt')
+            summary = mrz_generator.generate_encoded_file(path, 20000, seed=1, corrupt_fraction=0.05,
+                                                          bad_length_fraction=0.02)
+            codes = [MRTD.validate_mrz_record_detailed(record) for record in iter_encoded_records(path)]
+        histogram = MRTD.failure_histogram(codes)
+        self.assertEqual(histogram['bad_length'], summary['bad_length'])
+        self.assertAlmostEqual(summary['corrupted'] / 20000, 0.05, delta=0.01)
+        self.assertAlmostEqual(summary['bad_length'] / 20000, 0.02, delta=0.005)
+        # A corrupted record can also have been cut short, which hides its check digits
+        self.assertLessEqual(sum(1 for code in codes if code & ~MRTD.MRZ_BAD_LENGTH), summary['corrupted'])
+
+    def test_benchmark_helpers_accept_generated_records(self):
+        """The execution time measurement takes a generator as input and custom record counts."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_csv = os.path.join(tmpdir, 'times.csv')
+            with contextlib.redirect_stdout(io.StringIO()):
+                MRTD.measure_execution_times_validate_mrz(mrz_generator.generate_encoded_records(3000), output_csv,
+                                                          repeats=1, warmup=0, sizes=[1000, 3000])
+            with open(output_csv) as file:
+                self.assertEqual([row.split(',')[0] for row in file.read().split()[1:]], ['1000', '3000'])
+
+
+class TestCheckDigitAlgorithms(unittest.TestCase):
+
+    def setUp(self):
+        self.records = read_user_data('records_encoded.json')['records_encoded'][:200]
+        self.decoded = [MRTD.decode_mrz(*record.split(';')) for record in self.records]
+
+    def tearDown(self):
+        MRTD.CHECK_DIGIT_ALGORITHMS.pop('parity', None)
+
+    def test_icao_check_digits(self):
+        """The ICAO 7-3-1 digits match the ICAO 9303 specimen passport, in scalar and batch form."""
+        fields = ['L898902C3', '740812', '120415', 'ZE184226B', '<<<<<<<<<<<<<<']
+        self.assertEqual([MRTD.calculate_icao_check_digit(field) for field in fields], [6, 2, 9, 1, 0])
+        if np is not None:
+            self.assertEqual(MRTD.calculate_icao_check_digits(['L898902C3', 'ZE184226B']).tolist(), [6, 1])
+
+    def test_encode_and_validate_per_call(self):
+        """Records encoded with an algorithm validate only under the same algorithm."""
+        encoded = [encode_mrz(record, algorithm='icao') for record in self.decoded]
+        self.assertNotEqual(encoded, self.records)
+        self.assertTrue(all(validate_mrz(*entry.split(';'), algorithm='icao') for entry in encoded))
+        self.assertTrue(all(validate_mrz(*entry.split(';')) for entry in self.records))
+        results = validate_mrz_batch(self.records, workers=1, algorithm='icao')
+        self.assertEqual(results, [validate_mrz(*entry.split(';'), algorithm='icao') for entry in self.records])
+        self.assertEqual(encode_mrz_batch(self.decoded, workers=1, algorithm='icao'), encoded)
+        self.assertEqual(MRTD.validate_mrz_batch_detailed(encoded, workers=1, algorithm='icao'), [0] * len(encoded))
+        with self.assertRaises(ValueError):
+            validate_mrz(*self.records[0].split(';'), algorithm='luhn')
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_paths_follow_algorithm(self):
+        """Vectorized and columnar validation use the batch variant of the selected algorithm."""
+        encoded = [encode_mrz(record, algorithm='icao') for record in self.decoded]
+        self.assertTrue(validate_mrz_vectorized(encoded, algorithm='icao').all())
+        self.assertFalse(validate_mrz_vectorized(encoded).any())
+        batch = MRZBatch.from_records(encoded)
+        self.assertTrue(batch.validate(algorithm='icao').all())
+        self.assertEqual(len(batch.invalid(algorithm='crc32')), len(encoded))
+
+    def test_register_custom_algorithm(self):
+        """A registered algorithm becomes selectable by name and shows up in the backend benchmark."""
+        MRTD.register_check_digit_algorithm('parity', lambda field: len(field) % 2)
+        self.assertEqual(encode_mrz(self.decoded[0], algorithm='parity')[-1], '1')
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = MRTD.measure_check_digit_algorithms(repeats=1, warmup=0)
+        self.assertEqual(set(results), {'crc32', 'icao', 'parity'})
+        self.assertNotIn('batch', results['parity'])
+
+    def test_builtin_algorithms_cannot_be_replaced(self):
+        """Re-registering a built-in name raises instead of being silently ignored by the fast paths."""
+        for name in ('crc32', 'icao'):
+            with self.assertRaises(ValueError):
+                MRTD.register_check_digit_algorithm(name, lambda field: 0)
+        self.assertIs(MRTD.get_check_digit_algorithm('crc32').check_digit, calculate_crc32_check_digit)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestBufferValidation(unittest.TestCase):
+
+    def setUp(self):
+        records = read_user_data('records_encoded.json')['records_encoded'][:1000]
+        records[3] = records[3][:-1] + '<'
+        records[500] = records[500][:-1] + str((int(records[500][-1]) + 1) % 10)
+        self.records = records
+        self.expected = validate_mrz_vectorized(records).tolist()
+
+    def test_matches_vectorized_for_both_record_sizes(self):
+        """Newline-terminated and packed 88-byte buffers give the same results as the vectorized validator."""
+        with_newlines = ''.join(record + '\n' for record in self.records).encode()
+        packed = bytearray(''.join(self.records).encode())
+        self.assertEqual(MRTD.validate_mrz_buffer(with_newlines).tolist(), self.expected)
+        self.assertEqual(MRTD.validate_mrz_buffer(packed, record_size=88, threads=3, chunk_records=64).tolist(),
+                         self.expected)
+        with self.assertRaises(ValueError):
+            MRTD.validate_mrz_buffer(with_newlines[:-1])
+
+    def test_concurrent_callers_share_an_executor(self):
+        """Many threads validating through one shared pool all get correct results."""
+        from concurrent.futures import ThreadPoolExecutor
+        buffer = ''.join(record + '\n' for record in self.records).encode()
+        MRTD.reset_code_tables()
+        with ThreadPoolExecutor(max_workers=4) as executor, ThreadPoolExecutor(max_workers=8) as callers:
+            results = list(callers.map(
+                lambda _: MRTD.validate_mrz_buffer(buffer, chunk_records=100, check_codes=True, executor=executor),
+                range(16)))
+        expected = validate_mrz_vectorized(self.records, check_codes=True).tolist()
+        self.assertTrue(all(result.tolist() == expected for result in results))
+
+    def test_call_from_the_shared_executor_runs_inline(self):
+        """Tasks already running on the shared pool can validate through it without deadlocking."""
+        from concurrent.futures import ThreadPoolExecutor
+        buffer = ''.join(record + '\n' for record in self.records).encode()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(MRTD.validate_mrz_buffer, buffer, chunk_records=100, executor=executor)
+                       for _ in range(4)]
+            results = [future.result(timeout=30) for future in futures]
+        self.assertTrue(all(result.tolist() == self.expected for result in results))
+
+    def test_first_calls_from_many_threads(self):
+        """Concurrent first calls in a fresh interpreter load NumPy and the tables once and agree."""
+        script = (
+            "import MRTD\n"
+            "from concurrent.futures import ThreadPoolExecutor\n"
+            "buffer = ('p<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<;' + 'L898902C36UTO7408122F1204159ZE184226B<<<<<1').encode()"
+            " * 64\n"
+            "with ThreadPoolExecutor(max_workers=16) as pool:\n"
+            "    results = list(pool.map(lambda _: MRTD.validate_mrz_buffer(buffer, record_size=88, check_codes=True)"
+            ".tolist(), range(16)))\n"
+            "print(len({tuple(result) for result in results}))\n")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(MRTD.__file__)))
+        self.assertEqual(output.stdout.strip(), '1')
+
+    def test_valid_codes_are_read_only(self):
+        """The shared code table cannot be modified through VALID_CODES."""
+        with self.assertRaises(TypeError):
+            MRTD.VALID_CODES['XXX'] = 'Nowhere'
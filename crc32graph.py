@@ -1,6 +1,10 @@
+import sys
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from mrz_benchmark import compare_results, load_results
+
 def plot_execution_times(csv_file, plot_filename, dataset_type):
     """
     Function to plot execution times and save the plot.
@@ -17,10 +21,17 @@ def plot_execution_times(csv_file, plot_filename, dataset_type):
     plt.figure(figsize=(10, 6))
 
     # Plot Exec_Time_With_Tests
-    plt.plot(data['Lines_Read'], data['Exec_Time_With_Tests'], label=f'{dataset_type.capitalize()} - No Tests', color='b', marker='o')
+    plt.plot(data['Lines_Read'], data['Exec_Time_With_Tests'], label=f'{dataset_type.capitalize()} - With Tests', color='b', marker='o')
 
     # Plot Exec_Time_No_Tests
-    plt.plot(data['Lines_Read'], data['Exec_Time_No_Tests'], label=f'{dataset_type.capitalize()} - With Tests', color='r', marker='x')
+    plt.plot(data['Lines_Read'], data['Exec_Time_No_Tests'], label=f'{dataset_type.capitalize()} - No Tests', color='r', marker='x')
+
+    # Shade the interquartile range when the CSV was written by the repeated-run benchmarks
+    if 'IQR_No_Tests' in data:
+        plt.fill_between(data['Lines_Read'], data['Exec_Time_No_Tests'] - data['IQR_No_Tests'] / 2,
+                         data['Exec_Time_No_Tests'] + data['IQR_No_Tests'] / 2, color='r', alpha=0.2)
+        plt.fill_between(data['Lines_Read'], data['Exec_Time_With_Tests'] - data['IQR_With_Tests'] / 2,
+                         data['Exec_Time_With_Tests'] + data['IQR_With_Tests'] / 2, color='b', alpha=0.2)
 
     # Adding titles and labels
     plt.title(f'Execution Time Comparison for {dataset_type.capitalize()} Data: With and Without Tests')
@@ -43,8 +54,50 @@ def plot_execution_times(csv_file, plot_filename, dataset_type):
     # Display the plot
     plt.show()
 
-# Plot and save for encode data
-plot_execution_times('execution_times_encode_mrz.csv', 'execution_time_comparison_encode.png', 'encode')
+def plot_benchmark_comparison(result_files, plot_filename, threshold=0.10):
+    """
+    Function to plot benchmark results of several commits side by side and report regressions.
+
+    Parameters:
+    result_files (list): JSON files written by mrz_benchmark.py, oldest first.
+    plot_filename (str): The file name to save the plot.
+    threshold (float): Relative slowdown of the median reported as a regression.
+
+    Returns the regressions of the last result file against the first one.
+    """
+    runs = [load_results(path) for path in result_files]
+    stages = sorted({entry['stage'] for run in runs for entry in run['results']})
+
+    fig, axes = plt.subplots(1, len(stages), figsize=(5 * len(stages), 5), squeeze=False)
+    for axis, stage in zip(axes[0], stages):
+        for run in runs:
+            entries = sorted((entry for entry in run['results'] if entry['stage'] == stage), key=lambda entry: entry['records'])
+            axis.errorbar([entry['records'] for entry in entries],
+                          [entry['records_per_sec'] for entry in entries],
+                          yerr=[entry['records'] * entry['iqr'] / entry['median'] ** 2 / 2 for entry in entries],
+                          label=run['commit'], marker='o', capsize=3)
+        axis.set_title(f'{stage.capitalize()} throughput')
+        axis.set_xlabel('Number of Records')
+        axis.set_ylabel('Records per Second (median)')
+        axis.set_xscale('log')
+        axis.grid(True)
+        axis.legend()
+    plt.tight_layout()
+    plt.savefig(plot_filename)
+    plt.show()
+
+    regressions = compare_results(runs[0], runs[-1], threshold)
+    for regression in regressions:
+        print(f"Regression in {regression['stage']} ({regression['records']} records): {regression['change']:+.1%}")
+    return regressions
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Compare benchmark result files: python crc32graph.py benchmark_a.json benchmark_b.json ...
+        plot_benchmark_comparison(sys.argv[1:], 'benchmark_comparison.png')
+    else:
+        # Plot and save for encode data
+        plot_execution_times('execution_times_encode_mrz.csv', 'execution_time_comparison_encode.png', 'encode')
 
-# Plot and save for validate data
-plot_execution_times('execution_times_validate_mrz.csv', 'execution_time_comparison_validate.png', 'validate')
\ No newline at end of file
+        # Plot and save for validate data
+        plot_execution_times('execution_times_validate_mrz.csv', 'execution_time_comparison_validate.png', 'validate')
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from MRTD import (MODULE_DIR, decode_mrz, detect_record_format, encode_mrz, read_user_data, time_repeated,
+                  timing_statistics, validate_mrz)
+
+# Stages timed by run_benchmarks: reading the raw file, parsing JSON into line pairs,
+# encoding decoded records and validating encoded records
+STAGES = ('io', 'parse', 'encode', 'validate')
+
+
+def current_commit() -> str:
+    """Return the short hash of the checked-out commit, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=MODULE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def parse_encoded(raw: bytes, file_format: str = 'json'):
+    """Parse the bytes of an encoded record JSON, JSON Lines or text file into (line1, line2) pairs."""
+    if file_format == 'json':
+        entries = json.loads(raw)['records_encoded']
+    elif file_format == 'jsonl':
+        entries = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        entries = [line for line in raw.decode().splitlines() if line.strip()]
+    return [tuple(entry.split(';')[:2]) for entry in entries]
+
+
+def run_benchmarks(encoded_file='records_encoded.json', decoded_file=None, sizes=(1000, 10000),
+                   stages=STAGES, repeats: int = 7, warmup: int = 2):
+    """Benchmark each stage with warmup and repeated runs, returning machine-readable results.
+
+    The encoded input may be a JSON, JSON Lines or text record file, such as one
+    written by mrz_generator. It is read and parsed once outside the timed regions. The io and parse stages
+    always cover the whole file; encode and validate are timed for every size in `sizes`.
+    Decoded records come from `decoded_file` when given, otherwise from decoding the
+    encoded records.
+    """
+    file_format = detect_record_format(encoded_file)
+    with open(encoded_file, 'rb') as file:
+        raw = file.read()
+    pairs = parse_encoded(raw, file_format)
+    if 'encode' in stages:
+        if decoded_file is not None:
+            decoded = read_user_data(decoded_file)['records_decoded']
+        else:
+            decoded = [decode_mrz(line1, line2) for line1, line2 in pairs]
+
+    def read_file():
+        with open(encoded_file, 'rb') as file:
+            file.read()
+
+    results = []
+    for stage in stages:
+        if stage == 'io':
+            timings = time_repeated(read_file, repeats, warmup)
+            results.append(dict(stage=stage, **timing_statistics(timings, len(pairs))))
+        elif stage == 'parse':
+            timings = time_repeated(lambda: parse_encoded(raw, file_format), repeats, warmup)
+            results.append(dict(stage=stage, **timing_statistics(timings, len(pairs))))
+        elif stage in ('encode', 'validate'):
+            for size in sizes:
+                if stage == 'encode':
+                    subset = decoded[:size]
+                    timings = time_repeated(lambda: [encode_mrz(record) for record in subset], repeats, warmup)
+                else:
+                    subset = pairs[:size]
+                    timings = time_repeated(lambda: [validate_mrz(line1, line2) for line1, line2 in subset],
+                                            repeats, warmup)
+                results.append(dict(stage=stage, **timing_statistics(timings, len(subset))))
+        else:
+            raise ValueError(f"Unknown benchmark stage: {stage}")
+    return {
+        "commit": current_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "input": encoded_file,
+        "repeats": repeats,
+        "warmup": warmup,
+        "results": results,
+    }
+
+
+def write_results(results, output_path: str):
+    """Write benchmark results as JSON."""
+    with open(output_path, 'w') as file:
+        json.dump(results, file, indent=4)
+
+
+def load_results(file_path: str):
+    """Load benchmark results written by write_results."""
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def compare_results(baseline, current, threshold: float = 0.10):
+    """Return the stages that got slower between two benchmark results.
+
+    A (stage, records) entry counts as a regression when its median grew by more than
+    `threshold` and the interquartile ranges of the two runs do not overlap, which keeps
+    ordinary run-to-run noise from being reported.
+    """
+    baseline_entries = {(entry['stage'], entry['records']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in current['results']:
+        previous = baseline_entries.get((entry['stage'], entry['records']))
+        if previous is None:
+            continue
+        change = entry['median'] / previous['median'] - 1
+        if change > threshold and entry['q1'] > previous['q3']:
+            regressions.append({
+                "stage": entry['stage'],
+                "records": entry['records'],
+                "baseline_median": previous['median'],
+                "current_median": entry['median'],
+                "change": change,
+            })
+    return regressions
+
+
+def print_results(results):
+    print(f"Commit {results['commit']} ({results['repeats']} runs after {results['warmup']} warmup)")
+    for entry in results['results']:
+        print(f"{entry['stage']:>9} {entry['records']:>9} records: median {entry['median'] * 1000:9.3f} ms, "
+              f"IQR {entry['iqr'] * 1000:8.3f} ms, {entry['records_per_sec']:12.0f} records/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MRTD benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run the benchmarks and write JSON results")
+    run.add_argument('--input', default='records_encoded.json')
+    run.add_argument('--decoded', default=None)
+    run.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    run.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    run.add_argument('--repeats', type=int, default=7)
+    run.add_argument('--warmup', type=int, default=2)
+    run.add_argument('--output', default=None, help="defaults to benchmark_<commit>.json")
+    run.add_argument('--synthetic', type=int, default=None, metavar='COUNT',
+                     help="benchmark COUNT generated records instead of --input")
+    run.add_argument('--seed', type=int, default=0)
+    compare = commands.add_parser('compare', help="report regressions between two result files")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        if args.synthetic:
+            from mrz_generator import generate_encoded_file
+            with tempfile.TemporaryDirectory() as tmpdir:
+                encoded_file = os.path.join(tmpdir, f'synthetic_{args.synthetic}_{args.seed}.txt')
+                generate_encoded_file(encoded_file, args.synthetic, args.seed)
+                results = run_benchmarks(encoded_file, None, args.sizes, args.stages, args.repeats, args.warmup)
+        else:
+            results = run_benchmarks(args.input, args.decoded, args.sizes, args.stages, args.repeats, args.warmup)
+        output_path = args.output or f"benchmark_{results['commit']}.json"
+        write_results(results, output_path)
+        print_results(results)
+        print(f"Benchmark results have been saved to {output_path}")
+    else:
+        regressions = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['stage']} ({regression['records']} records): "
+                  f"{regression['baseline_median'] * 1000:.3f} ms -> {regression['current_median'] * 1000:.3f} ms "
+                  f"({regression['change']:+.1%})")
+        if not regressions:
+            print("No regressions found.")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
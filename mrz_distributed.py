@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from MRTD import MRZ_VALID, detect_compression, detect_record_format, validate_mrz_record_detailed
+
+# Lines of an indented JSON record file that hold no record: braces, brackets and the array key
+JSON_STRUCTURE = ('{', '}', '[', ']', ']}', '],')
+
+
+def plan_shards(file_path: str, shards: int):
+    """Split a record file into at most `shards` (start, end) byte ranges that begin and end on line starts."""
+    size = os.path.getsize(file_path)
+    boundaries = [0]
+    with open(file_path, 'rb') as file:
+        for i in range(1, shards):
+            target = size * i // shards
+            if target <= boundaries[-1]:
+                continue
+            # Move the boundary to the start of the next line
+            file.seek(target - 1)
+            file.readline()
+            position = file.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def iter_shard_records(file_path: str, start: int, end: int, file_format: str):
+    """Yield the encoded records stored in the lines of one shard.
+
+    JSON files must hold one record per line, the layout written by json.dump with
+    indentation and by EncodedRecordWriter.
+    """
+    if file_format not in ('text', 'jsonl', 'json'):
+        raise ValueError(f"Unsupported record format: {file_format}")
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        # Shards start and end on line starts, so reading whole lines up to `end` covers the shard exactly
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            line = line.decode().strip()
+            if not line:
+                continue
+            if file_format == 'text':
+                yield line
+            elif file_format == 'jsonl':
+                yield json.loads(line)
+            else:
+                if line.endswith(','):
+                    line = line[:-1]
+                if line.startswith('"') and line.endswith('"'):
+                    yield json.loads(line)
+                elif line not in JSON_STRUCTURE and not line.endswith('['):
+                    raise ValueError("JSON record files must hold one record per line to be sharded")
+
+
+def validate_shard(file_path: str, start: int, end: int, file_format: str, check_codes: bool = False):
+    """Validate the records of one shard and return its valid/invalid summary (runs inside worker processes).
+
+    Uses validate_mrz_record_detailed, so a malformed record counts as invalid instead
+    of failing the whole shard.
+    """
+    summary = {"valid": 0, "invalid": 0, "invalid_records": []}
+    for entry in iter_shard_records(file_path, start, end, file_format):
+        if validate_mrz_record_detailed(entry, check_codes) == MRZ_VALID:
+            summary['valid'] += 1
+        else:
+            parts = entry.split(';')
+            summary['invalid'] += 1
+            summary['invalid_records'].append({
+                "line1": parts[0],
+                "line2": parts[1] if len(parts) > 1 else '',
+                "is_valid": False
+            })
+    return summary
+
+
+def merge_summaries(summaries):
+    """Merge shard summaries, in shard order, into one summary."""
+    merged = {"valid": 0, "invalid": 0, "invalid_records": []}
+    for summary in summaries:
+        merged['valid'] += summary['valid']
+        merged['invalid'] += summary['invalid']
+        merged['invalid_records'].extend(summary['invalid_records'])
+    return merged
+
+
+def run_sharded_validation(file_path: str, workers: int = None, shards: int = None, file_format: str = None,
+                           check_codes: bool = False, max_retries: int = 2, shard_function=validate_shard):
+    """Validate a record file by byte-range shards in worker processes and merge the results.
+
+    Returns the summary of summarize_mrz_validation plus the number of shards and
+    retries. A shard failing with OSError is resubmitted up to `max_retries` times; if a
+    worker dies and breaks the pool, a new pool is created and every unfinished shard is
+    resubmitted. Any other exception is a bug and propagates at once.
+    """
+    if detect_compression(file_path) is not None:
+        raise ValueError("Compressed record files cannot be split into byte-range shards")
+    file_format = file_format or detect_record_format(file_path)
+    workers = workers or os.cpu_count() or 1
+    # A few shards per worker keeps the workers busy when shard sizes differ
+    shard_ranges = plan_shards(file_path, shards or 4 * workers)
+    results = [None] * len(shard_ranges)
+    attempts = [0] * len(shard_ranges)
+    retries = 0
+    remaining = set(range(len(shard_ranges)))
+    while remaining:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(shard_function, file_path, *shard_ranges[shard], file_format, check_codes): shard
+                       for shard in sorted(remaining)}
+            pool_broken = False
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard = futures.pop(future)
+                    try:
+                        results[shard] = future.result()
+                        remaining.discard(shard)
+                    except BrokenProcessPool:
+                        pool_broken = True
+                        attempts[shard] += 1
+                    except OSError:
+                        attempts[shard] += 1
+                        if attempts[shard] > max_retries:
+                            raise
+                        retries += 1
+                        futures[executor.submit(shard_function, file_path, *shard_ranges[shard], file_format,
+                                                check_codes)] = shard
+                if pool_broken:
+                    break
+        if pool_broken:
+            for shard in remaining:
+                if attempts[shard] > max_retries:
+                    raise BrokenProcessPool(f"Shard {shard} of {file_path} failed {attempts[shard]} times")
+            retries += len(remaining)
+    summary = merge_summaries(results)
+    summary['shards'] = len(shard_ranges)
+    summary['retries'] = retries
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an encoded record file in byte-range shards")
+    parser.add_argument('input', nargs='?', default='records_encoded.json')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shards', type=int, default=None)
+    parser.add_argument('--format', dest='file_format', choices=('json', 'jsonl', 'text'), default=None)
+    parser.add_argument('--check-codes', action='store_true')
+    parser.add_argument('--max-retries', type=int, default=2)
+    args = parser.parse_args()
+    summary = run_sharded_validation(args.input, args.workers, args.shards, args.file_format, args.check_codes,
+                                     args.max_retries)
+    print(f"Validated {args.input} in {summary['shards']} shards ({summary['retries']} retries)")
+    print('Total Valid Data : ', summary['valid'])
+    print('Total Invalid Data : ', summary['invalid'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import functools
+import json
+import time
+
+from MRTD import (LINE1_WIDTH, LINE2_CHECKED_FIELDS, RECORD_WIDTH, calculate_crc32_check_digits, decode_mrz,
+                  detect_record_format, get_country_code_index, map_record_chunks, np, open_record_file)
+
+# Records per generated chunk; each chunk has its own seed, so output does not depend on the worker count
+CHUNK_RECORDS = 100000
+# Bytes following the record text in each output format ('line1;line2' plus these)
+RECORD_SUFFIX = {'text': b'\n', 'jsonl': b'"\n', 'json': b'"'}
+RECORD_PREFIX = {'text': b'', 'jsonl': b'"', 'json': b',\n"'}
+JSON_HEADER = b'{"records_encoded": [\n'
+JSON_FOOTER = b'\n]}\n'
+
+ALPHANUMERIC = b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+FILLER = ord('<')
+# Birth dates span 1930-2009 and expiry dates 2020-2039, as days since 1970-01-01
+BIRTH_DAYS = (-14610, 14610)
+EXPIRY_DAYS = (18262, 25567)
+
+
+def chunk_rng(seed: int, chunk_index: int):
+    """Return the random generator of one chunk, derived from the run seed and the chunk position."""
+    return np.random.default_rng(np.random.SeedSequence([seed, chunk_index]))
+
+
+def _three_letter_codes():
+    codes = [code for code in get_country_code_index().iter_codes() if '<' not in code]
+    return np.frombuffer(''.join(codes).encode(), dtype=np.uint8).reshape(-1, 3)
+
+
+def _random_text(rng, count: int, width: int, alphabet):
+    return np.frombuffer(alphabet, dtype=np.uint8)[rng.integers(0, len(alphabet), size=(count, width), dtype=np.uint8)]
+
+
+@functools.lru_cache(maxsize=None)
+def _date_table(day_range):
+    """Return a (days, 6) uint8 table of the YYMMDD text of every day in day_range."""
+    text = np.datetime_as_string(np.arange(*day_range).astype('datetime64[D]')).astype('S10')
+    return np.frombuffer(text.tobytes(), dtype=np.uint8).reshape(-1, 10)[:, [2, 3, 5, 6, 8, 9]]
+
+
+def _random_dates(rng, count: int, day_range):
+    """Return a (count, 6) uint8 array of YYMMDD dates drawn uniformly from day_range."""
+    table = _date_table(day_range)
+    return table[rng.integers(0, len(table), size=count)]
+
+
+@functools.lru_cache(maxsize=None)
+def _name_layouts():
+    """Return a (15, 11, 11, 39) bool table marking the letters of LAST<<GIVEN<SECOND by name lengths."""
+    last, given, second, column = np.ogrid[:15, :11, :11, :39]
+    second_start = last + 2 + given + 1
+    return ((column < last) | ((column >= last + 2) & (column < last + 2 + given))
+            | ((second > 0) & (column >= second_start) & (column < second_start + second)))
+
+
+def _name_field(rng, count: int):
+    """Return (count, 39) uint8 name fields: LAST<<GIVEN, sometimes with a second given name."""
+    last = rng.integers(2, 15, size=count)
+    given = rng.integers(2, 11, size=count)
+    second = np.where(rng.random(count) < 0.3, rng.integers(2, 11, size=count), 0)
+    is_letter = _name_layouts()[last, given, second]
+    return np.where(is_letter, rng.integers(ord('A'), ord('Z') + 1, size=(count, 39), dtype=np.uint8), np.uint8(FILLER))
+
+
+def generate_rows(rng, count: int):
+    """Return a (count, 88) uint8 array of valid 'line1;line2' records, byte-identical to encode_mrz output."""
+    if np is None:
+        raise RuntimeError("mrz_generator requires NumPy")
+    codes = _three_letter_codes()
+    rows = np.full((count, RECORD_WIDTH), FILLER, dtype=np.uint8)
+    rows[:, 0] = ord('p')
+    rows[:, 2:5] = codes[rng.integers(0, len(codes), size=count)]
+    rows[:, 5:44] = _name_field(rng, count)
+    rows[:, LINE1_WIDTH] = ord(';')
+    line2 = rows[:, LINE1_WIDTH + 1:]
+    line2[:, 0:9] = _random_text(rng, count, 9, ALPHANUMERIC)
+    line2[:, 10:13] = codes[rng.integers(0, len(codes), size=count)]
+    line2[:, 13:19] = _random_dates(rng, count, BIRTH_DAYS)
+    line2[:, 20] = np.frombuffer(b'MF', dtype=np.uint8)[rng.integers(0, 2, size=count)]
+    line2[:, 21:27] = _random_dates(rng, count, EXPIRY_DAYS)
+    line2[:, 28:37] = _random_text(rng, count, 9, ALPHANUMERIC)
+    for start, end, check_position in LINE2_CHECKED_FIELDS:
+        line2[:, check_position] = calculate_crc32_check_digits(np.ascontiguousarray(line2[:, start:end])) + ord('0')
+    return rows
+
+
+def corrupt_check_digits(rng, rows, fraction: float):
+    """Replace one check digit with a different digit in about `fraction` of the rows; return their indices."""
+    corrupted = np.flatnonzero(rng.random(len(rows)) < fraction)
+    positions = np.array([LINE1_WIDTH + 1 + check_position for _, _, check_position in LINE2_CHECKED_FIELDS])
+    columns = positions[rng.integers(0, len(positions), size=len(corrupted))]
+    digits = rows[corrupted, columns] - ord('0')
+    rows[corrupted, columns] = (digits + rng.integers(1, 10, size=len(corrupted))) % 10 + ord('0')
+    return corrupted
+
+
+def generate_chunk(count: int, seed: int = 0, chunk_index: int = 0, corrupt_fraction: float = 0.0,
+                   bad_length_fraction: float = 0.0, file_format: str = 'text'):
+    """Generate one chunk of encoded records serialized for file_format.
+
+    Returns (data, corrupted, bad_length). About `corrupt_fraction` of the records get a
+    wrong check digit and about `bad_length_fraction` get a line 2 cut short by one to
+    three characters. JSON chunks start with the ',\\n' separator, which the writer drops
+    for the first record of a file.
+    """
+    rng = chunk_rng(seed, chunk_index)
+    rows = generate_rows(rng, count)
+    corrupted = corrupt_check_digits(rng, rows, corrupt_fraction)
+    bad_length = np.flatnonzero(rng.random(count) < bad_length_fraction)
+    prefix = RECORD_PREFIX[file_format]
+    suffix = RECORD_SUFFIX[file_format]
+    parts = [np.broadcast_to(np.frombuffer(prefix, dtype=np.uint8), (count, len(prefix))), rows,
+             np.broadcast_to(np.frombuffer(suffix, dtype=np.uint8), (count, len(suffix)))]
+    data = np.concatenate(parts, axis=1).tobytes()
+    if len(bad_length):
+        # Only the shortened records are rebuilt; everything between them is sliced out as is
+        record_size = len(prefix) + RECORD_WIDTH + len(suffix)
+        cuts = rng.integers(1, 4, size=len(bad_length))
+        pieces = []
+        position = 0
+        for row, cut in zip(bad_length.tolist(), cuts.tolist()):
+            end_of_text = row * record_size + len(prefix) + RECORD_WIDTH
+            pieces.append(data[position:end_of_text - cut])
+            position = end_of_text
+        pieces.append(data[position:])
+        data = b''.join(pieces)
+    return data, len(corrupted), len(bad_length)
+
+
+def _generate_chunks(specs, seed, corrupt_fraction, bad_length_fraction, file_format):
+    """Generate a list of (chunk_index, count) chunks (runs inside pool workers)."""
+    return [generate_chunk(count, seed, chunk_index, corrupt_fraction, bad_length_fraction, file_format)
+            for chunk_index, count in specs]
+
+
+def chunk_specs(count: int, chunk_records: int = CHUNK_RECORDS):
+    """Return the (chunk_index, count) pairs covering `count` records."""
+    return [(index, min(chunk_records, count - start)) for index, start in enumerate(range(0, count, chunk_records))]
+
+
+def iter_generated_chunks(count: int, seed: int = 0, corrupt_fraction: float = 0.0, bad_length_fraction: float = 0.0,
+                          file_format: str = 'text', workers: int = 1, chunk_records: int = CHUNK_RECORDS):
+    """Yield generate_chunk results for `count` records in order, generated by `workers` processes."""
+    generate = functools.partial(_generate_chunks, seed=seed, corrupt_fraction=corrupt_fraction,
+                       bad_length_fraction=bad_length_fraction, file_format=file_format)
+    for _, results in map_record_chunks(generate, chunk_specs(count, chunk_records), workers, chunk_size=1):
+        yield from results
+
+
+def generate_encoded_records(count: int, seed: int = 0, corrupt_fraction: float = 0.0,
+                             bad_length_fraction: float = 0.0, chunk_records: int = CHUNK_RECORDS):
+    """Yield `count` synthetic 'line1;line2' records."""
+    for data, _, _ in iter_generated_chunks(count, seed, corrupt_fraction, bad_length_fraction, 'text',
+                                            chunk_records=chunk_records):
+        yield from data.decode().splitlines()
+
+
+def generate_decoded_records(count: int, seed: int = 0, chunk_records: int = CHUNK_RECORDS):
+    """Yield `count` synthetic records in the decoded shape encode_mrz expects."""
+    for entry in generate_encoded_records(count, seed, chunk_records=chunk_records):
+        yield decode_mrz(*entry.split(';'))
+
+
+def generate_encoded_file(output_path: str, count: int, seed: int = 0, corrupt_fraction: float = 0.0,
+                          bad_length_fraction: float = 0.0, file_format: str = None, workers: int = 1,
+                          chunk_records: int = CHUNK_RECORDS):
+    """Stream `count` synthetic encoded records to a JSON, JSON Lines or text file.
+
+    The output depends only on the seed and chunk_records, not on the number of workers.
+    Returns {"written", "corrupted", "bad_length"} record counts.
+    """
+    file_format = file_format or detect_record_format(output_path)
+    if file_format not in RECORD_SUFFIX:
+        raise ValueError(f"Unsupported record format: {file_format}")
+    summary = {"written": count, "corrupted": 0, "bad_length": 0}
+    with open_record_file(output_path, 'wb') as file:
+        if file_format == 'json':
+            file.write(JSON_HEADER)
+        first = True
+        for data, corrupted, bad_length in iter_generated_chunks(count, seed, corrupt_fraction, bad_length_fraction,
+                                                                 file_format, workers, chunk_records):
+            if first and file_format == 'json':
+                data = data[len(b',\n'):]
+            first = False
+            file.write(data)
+            summary['corrupted'] += corrupted
+            summary['bad_length'] += bad_length
+        if file_format == 'json':
+            file.write(JSON_FOOTER if count else b']}\n')
+    return summary
+
+
+def generate_decoded_file(output_path: str, count: int, seed: int = 0, chunk_records: int = CHUNK_RECORDS):
+    """Stream `count` synthetic decoded records to a {"records_decoded": [...]} JSON file."""
+    with open_record_file(output_path, 'w') as file:
+        file.write('{"records_decoded": [\n')
+        for index, record in enumerate(generate_decoded_records(count, seed, chunk_records)):
+            file.write((',\n' if index else '') + json.dumps(record))
+        file.write('\n]}\n' if count else ']}\n')
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic MRZ records")
+    parser.add_argument('kind', choices=('encoded', 'decoded'))
+    parser.add_argument('output')
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corrupt', type=float, default=0.0, help="fraction of records with a wrong check digit")
+    parser.add_argument('--bad-length', type=float, default=0.0, help="fraction of records with a short line 2")
+    parser.add_argument('--format', dest='file_format', choices=('json', 'jsonl', 'text'), default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    if args.kind == 'encoded':
+        summary = generate_encoded_file(args.output, args.count, args.seed, args.corrupt, args.bad_length,
+                                        args.file_format, args.workers)
+    else:
+        summary = {"written": generate_decoded_file(args.output, args.count, args.seed)}
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {summary['written']} records to {args.output} in {elapsed:.3f} seconds "
+          f"({summary['written'] / elapsed:.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
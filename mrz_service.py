@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+
+from MRTD import validate_mrz
+
+# Line protocol: each request is a 'line1;line2' record terminated by a newline and
+# is answered with VALID, INVALID or ERROR <reason>. 'STATS' returns a JSON snapshot.
+STATS_COMMAND = 'STATS'
+
+
+def percentile(sorted_samples, fraction: float) -> float:
+    """Return the nearest-rank percentile of an already sorted list of samples."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def validate_record(entry: str):
+    """Validate one 'line1;line2' record, returning the exception instead of raising it."""
+    try:
+        parts = entry.split(';')
+        return validate_mrz(parts[0], parts[1])
+    except (IndexError, ValueError) as error:
+        return error
+
+
+class ServiceStats:
+    """Request, batch and latency counters of the validation service."""
+
+    def __init__(self, max_samples: int = 100000):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.valid = 0
+        self.invalid = 0
+        self.errors = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=max_samples)
+
+    def record_batch(self):
+        self.batches += 1
+
+    def record_result(self, result, latency: float):
+        self.requests += 1
+        if isinstance(result, Exception):
+            self.errors += 1
+        elif result:
+            self.valid += 1
+        else:
+            self.invalid += 1
+        self.latencies.append(latency)
+
+    def snapshot(self):
+        """Return the counters plus p50/p99 latency (ms) and throughput (requests/s)."""
+        elapsed = time.perf_counter() - self.started
+        samples = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "valid": self.valid,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "p50_latency_ms": percentile(samples, 0.50) * 1000,
+            "p99_latency_ms": percentile(samples, 0.99) * 1000,
+            "throughput_rps": self.requests / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+class MicroBatcher:
+    """Group concurrently submitted records into micro-batches and validate each batch at once."""
+
+    def __init__(self, max_batch_size: int = 256, max_wait_ms: float = 2.0, stats: ServiceStats = None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = stats if stats is not None else ServiceStats()
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def submit(self, entry: str) -> bool:
+        """Queue a record for the next batch and wait for its validation result."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((entry, future, time.perf_counter()))
+        return await future
+
+    async def next_batch(self):
+        """Wait for the first record, then collect more until the batch is full or max_wait elapses."""
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            self.stats.record_batch()
+            for entry, future, submitted in batch:
+                result = validate_record(entry)
+                self.stats.record_result(result, time.perf_counter() - submitted)
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+async def read_request_line(reader):
+    """Return the next line from the stream (b'' at end of stream), or None for a line over the reader's limit.
+
+    The rest of an overlong line is read and dropped, so the following request is read intact.
+    """
+    try:
+        return await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as error:
+        return error.partial
+    except asyncio.LimitOverrunError as error:
+        discard = error.consumed
+    while True:
+        try:
+            await reader.readexactly(discard)
+            await reader.readuntil(b'\n')
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as error:
+            discard = error.consumed
+
+class MRZValidationServer:
+    """Asyncio TCP server answering one validation result per request line."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, max_batch_size: int = 256, max_wait_ms: float = 2.0):
+        self.host = host
+        self.port = port
+        self.stats = ServiceStats()
+        self.batcher = MicroBatcher(max_batch_size, max_wait_ms, self.stats)
+        self.server = None
+
+    async def start(self):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        # Port 0 asks the OS for a free port, report the one actually bound
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def respond(self, request: str) -> str:
+        if request is None:
+            return 'ERROR LimitOverrunError'
+        if '\ufffd' in request:
+            # Bytes that are not UTF-8 were replaced while decoding
+            return 'ERROR UnicodeDecodeError'
+        if request == STATS_COMMAND:
+            return json.dumps(self.stats.snapshot())
+        try:
+            return 'VALID' if await self.batcher.submit(request) else 'INVALID'
+        except (IndexError, ValueError) as error:
+            return f'ERROR {type(error).__name__}'
+
+    async def handle_client(self, reader, writer):
+        # Pipelined requests are validated concurrently but answered in order
+        responses = asyncio.Queue()
+
+        async def write_responses():
+            while True:
+                task = await responses.get()
+                if task is None:
+                    break
+                writer.write((await task + '\n').encode())
+                await writer.drain()
+
+        writer_task = asyncio.get_running_loop().create_task(write_responses())
+        try:
+            while True:
+                line = await read_request_line(reader)
+                if line is None:
+                    await responses.put(asyncio.ensure_future(self.respond(None)))
+                    continue
+                if not line:
+                    break
+                request = line.decode(errors='replace').strip()
+                if request:
+                    await responses.put(asyncio.ensure_future(self.respond(request)))
+        finally:
+            await responses.put(None)
+            await writer_task
+            writer.close()
+            await writer.wait_closed()
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, max_batch_size: int = 256, max_wait_ms: float = 2.0):
+    """Run the validation service until cancelled."""
+    server = MRZValidationServer(host, port, max_batch_size, max_wait_ms)
+    await server.start()
+    print(f"MRZ validation service listening on {server.host}:{server.port}")
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.stop()
+        print(json.dumps(server.stats.snapshot(), indent=4))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching MRZ validation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,25 @@
-from MRTD import validate_mrz_from_json, read_user_data, encode_mrz, write_encoded_records, measure_execution_times_encode_mrz, measure_execution_times_validate_mrz
+from MRTD import summarize_mrz_validation, summarize_mrz_validation_incremental, encode_mrz_stream, measure_execution_times_encode_mrz, measure_execution_times_validate_mrz
+from mrz_distributed import run_sharded_validation
+from mrz_service import serve
+import asyncio
+import os
 import time
 
+# Number of worker processes used for batch encoding and validation
+WORKERS = int(os.environ.get('MRTD_WORKERS', os.cpu_count() or 1))
+# Optional sqlite file remembering validation results so re-runs only validate new or changed records
+VALIDATION_INDEX = os.environ.get('MRTD_VALIDATION_INDEX')
+
+
+def print_validation_summary(summary):
+    for result in summary['invalid_records']:
+        print(f"Line 1: {result['line1']}")
+        print(f"Line 2: {result['line2']}")
+        print(f"Is Valid: {result['is_valid']}")
+        print("-" * 40)
+    print('Total Valid Data : ', summary['valid'])
+    print('Total Invalid Data : ', summary['invalid'])
+
 
 def main():
     while True:
@@ -8,50 +27,53 @@ def main():
         print("2. Validate Passport Data")
         print("3. Measure Execution Times for Encoding Passport")
         print("4. Measure Execution Times for Validate Passport")
+        print("5. Start Validation Service")
+        print("6. Validate Passport Data in Shards")
         option = input("Enter your choice (type 'exit' or 0 to quit): ").strip().lower()
         
         if option == '1':
             file_path = 'records_decoded.json'
             output_file_path = 'records_encoded.json'
-            records_encoded = []
-            records = read_user_data(file_path)
             start_time = time.perf_counter()
-            for user_record in records['records_decoded']:
-                encoded_rocord = encode_mrz(user_record)
-                records_encoded.append(encoded_rocord)
+            encode_mrz_stream(file_path, output_file_path, workers=WORKERS)
             end_time = time.perf_counter()
-            write_encoded_records(records_encoded, output_file_path)
             print("The MRZ encoding process is complete. The encoded records have been saved to 'records_encoded.json'.")
-            print(f"Downloaded the tutorial in {end_time - start_time:0.4f} seconds")
+            print(f"Encoded the records in {end_time - start_time:0.4f} seconds")
             
         
         elif option == '2':
             file_path = "records_encoded.json"  # Path to the input JSON file
-            results = validate_mrz_from_json(file_path)
-            is_valid_true = 0
-            is_valid_false = 0
-            for result in results:
-                if result['is_valid'] == True:
-                    is_valid_true +=1
-                else:
-                    is_valid_false +=1
-                    print(f"Line 1: {result['line1']}")
-                    print(f"Line 2: {result['line2']}")
-                    print(f"Is Valid: {result['is_valid']}")
-                    print("-" * 40)
-            print('Total Valid Data : ', is_valid_true)
-            print('Total Invalid Data : ', is_valid_false)
+            if VALIDATION_INDEX:
+                summary = summarize_mrz_validation_incremental(file_path, VALIDATION_INDEX, workers=WORKERS)
+            else:
+                summary = summarize_mrz_validation(file_path, workers=WORKERS)
+            print_validation_summary(summary)
+            if VALIDATION_INDEX:
+                print('Duplicates Dropped : ', summary['duplicates'])
+                print('Reused From Index : ', summary['cached'])
             
         elif option == '3':
             input_file = 'records_decoded.json'
             output_csv = 'execution_times_encode_mrz.csv'
-            measure_execution_times_encode_mrz(input_file, output_csv)
+            measure_execution_times_encode_mrz(input_file, output_csv, workers=WORKERS)
         
         elif option == '4':
             input_file = 'records_encoded.json'
             output_csv = 'execution_times_validate_mrz.csv'
-            measure_execution_times_validate_mrz(input_file, output_csv)
+            measure_execution_times_validate_mrz(input_file, output_csv, workers=WORKERS)
         
+        elif option == '5':
+            try:
+                asyncio.run(serve())
+            except KeyboardInterrupt:
+                print("Validation service stopped.")
+
+        elif option == '6':
+            file_path = "records_encoded.json"
+            summary = run_sharded_validation(file_path, workers=WORKERS)
+            print_validation_summary(summary)
+            print(f"Validated {summary['shards']} shards ({summary['retries']} retries)")
+
         elif option == 'exit' or option == '0':
             print("Exiting program.")
             break